@@ -0,0 +1,251 @@
+import argparse
+import csv
+import glob
+import heapq
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Offline batch mode: streams a JSONL or CSV file of questions through the
+# chatbot (tokenizer, ALBERT classifier and entity extraction) in fixed-size
+# batches and writes one JSON line per question as soon as its batch is done.
+#
+#   python batch_cli.py transcripts.jsonl answers.jsonl --batch-size 64
+#   python batch_cli.py transcripts.csv answers.jsonl --field question --workers 4
+#
+# The input is read lazily, so memory stays bounded however long the file is.
+# Questions are taken --sort-window batches at a time and the engine sorts
+# each window by token length before cutting it into batches, so batches hold
+# questions of similar length and carry little padding; the answers are still
+# written in input order, and the padding efficiency is reported at the end.
+# After every window the output is flushed and a checkpoint records how many
+# questions are done and how many output bytes belong to them, along with the
+# input (path, size, mtime), --field and the shard it was cut for; re-running
+# the same command resumes from there. A checkpoint left by a different input
+# or --field/--workers is refused rather than resumed into the wrong stream;
+# --restart discards it and starts over. --workers N splits the input into N shards
+# (by line number) handled by separate processes, then merges their outputs
+# back into input order. Lines without a usable question (invalid JSON, or no
+# string under --field) get an output line with an "error" instead of an
+# answer, and are counted as skipped.
+
+
+# Yield (line_number, question) from a .jsonl or .csv file without loading it;
+# only lines whose number falls in the shard are parsed. The question is None
+# when the line has no usable one.
+def read_queries(path, field="query", shard=0, num_shards=1):
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            for line_number, row in enumerate(csv.DictReader(f)):
+                if line_number % num_shards == shard:
+                    yield line_number, row.get(field)  # None for short rows and a missing column
+        else:
+            for line_number, line in enumerate(f):
+                if line_number % num_shards != shard or not line.strip():
+                    continue
+                try:
+                    query = json.loads(line).get(field)
+                except (ValueError, AttributeError):  # Not JSON, or not an object
+                    query = None
+                yield line_number, query if isinstance(query, str) else None
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class CheckpointError(Exception):
+    pass
+
+
+# What a checkpoint was written for; resuming needs all of it to match
+def run_source(input_path, field, shard=0, num_shards=1):
+    stat = os.stat(input_path)
+    return {
+        "input": os.path.abspath(input_path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "field": field,
+        "shard": shard,
+        "num_shards": num_shards,
+    }
+
+
+def load_checkpoint(path, source):
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        return {"source": source, "processed": 0, "output_bytes": 0}
+    except (OSError, ValueError) as e:
+        raise CheckpointError(f"Cannot read checkpoint {path} ({e}); rerun with --restart to start over")
+    recorded = checkpoint.get("source") if isinstance(checkpoint, dict) else None
+    if recorded != source:
+        changed = sorted(name for name in source if (recorded or {}).get(name) != source[name])
+        raise CheckpointError(f"Checkpoint {path} was written for a different run (changed: {', '.join(changed)}); "
+                              "rerun with --restart to start over")
+    return checkpoint
+
+
+def save_checkpoint(path, checkpoint):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def skipped_record(line_number, field):
+    return {"line": line_number, "query": None, "error": f"no question in field {field!r}"}
+
+
+def output_record(line_number, query, result):
+    return {
+        "line": line_number,
+        "query": query,
+        "intent": result["intent"],
+        "confidence": result["confidence"],
+        "entities": result["entities"],
+        "response": result["response"],
+    }
+
+
+def process_shard(input_path, output_path, field, batch_size, shard=0, num_shards=1, engine_options=None,
+                  sort_window=8):
+    # Answer every question whose line number falls in this shard; returns
+    # the number of questions answered and lines skipped in this run, and the
+    # padding counts
+    from chatbot_engine import ChatbotEngine, capitalize_prompt
+
+    checkpoint_path = output_path + ".ckpt"
+    checkpoint = load_checkpoint(checkpoint_path, run_source(input_path, field, shard, num_shards))
+    queries = read_queries(input_path, field, shard, num_shards)
+    queries = itertools.islice(queries, checkpoint["processed"], None)
+
+    engine = ChatbotEngine(**(engine_options or {}))
+    answered = skipped = 0
+    with open(output_path, "ab") as out:
+        # Drop anything written after the last checkpoint (e.g. a killed run)
+        out.truncate(checkpoint["output_bytes"])
+        out.seek(checkpoint["output_bytes"])
+        for batch in batched(queries, batch_size * sort_window):
+            valid = [(line_number, query) for line_number, query in batch if query is not None]
+            results = engine.respond([capitalize_prompt(query) for _, query in valid], batch_size)
+            answers = {line_number: result for (line_number, _), result in zip(valid, results)}
+            for line_number, query in batch:
+                if query is None:
+                    record = skipped_record(line_number, field)
+                else:
+                    record = output_record(line_number, query, answers[line_number])
+                out.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+            out.flush()
+            os.fsync(out.fileno())
+            checkpoint["processed"] += len(batch)
+            checkpoint["output_bytes"] = out.tell()
+            save_checkpoint(checkpoint_path, checkpoint)
+            answered += len(valid)
+            skipped += len(batch) - len(valid)
+    padding = engine.padding_stats.stats()
+    return {"answered": answered, "skipped": skipped, "tokens": padding["tokens"],
+            "padded_tokens": padding["padded_tokens"]}
+
+
+def _run_shard(args):
+    input_path, output_path, field, batch_size, shard, num_shards, engine_options, sort_window = args
+    return process_shard(input_path, output_path, field, batch_size, shard, num_shards, engine_options, sort_window)
+
+
+def _line_number(record):
+    return json.loads(record)["line"]
+
+
+def run(input_path, output_path, field="query", batch_size=64, workers=1, engine_options=None, sort_window=8,
+        restart=False):
+    # Returns {"answered", "skipped", "tokens", "padded_tokens"} for this run.
+    # Raises CheckpointError when a checkpoint belongs to a different run,
+    # unless restart is set, which drops every checkpoint and shard output.
+    if restart:
+        for path in glob.glob(glob.escape(output_path) + ".ckpt") + glob.glob(glob.escape(output_path) + ".part*"):
+            os.remove(path)
+    if workers <= 1:
+        return process_shard(input_path, output_path, field, batch_size, engine_options=engine_options,
+                             sort_window=sort_window)
+
+    # Each worker process gets its own engine and an equal share of the cores
+    options = dict(engine_options or {}, parallel=False, torch_threads=max(1, (os.cpu_count() or 1) // workers))
+    shard_paths = [f"{output_path}.part{shard}" for shard in range(workers)]
+    for shard, shard_path in enumerate(shard_paths):  # Refuse before any shard starts
+        load_checkpoint(shard_path + ".ckpt", run_source(input_path, field, shard, workers))
+    jobs = [
+        (input_path, shard_path, field, batch_size, shard, workers, options, sort_window)
+        for shard, shard_path in enumerate(shard_paths)
+    ]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        shard_stats = list(pool.map(_run_shard, jobs))
+    totals = {name: sum(stats[name] for stats in shard_stats) for name in shard_stats[0]}
+
+    # Each shard is in input order, so merging them by line number restores
+    # the order of the whole input (streamed, never held in memory)
+    parts = [open(shard_path, "rb") for shard_path in shard_paths]
+    try:
+        with open(output_path, "wb") as out:
+            out.writelines(heapq.merge(*parts, key=_line_number))
+    finally:
+        for part in parts:
+            part.close()
+    for shard_path in shard_paths:
+        os.remove(shard_path)
+        os.remove(shard_path + ".ckpt")
+    if os.path.exists(output_path + ".ckpt"):  # Left by a single-worker run; no longer describes the output
+        os.remove(output_path + ".ckpt")
+    return totals
+
+
+def main():
+    from chatbot_engine import default_torch_threads
+    from model_artifacts import default_model_dir, ensure_model_files
+    from model_backends import backend_names
+
+    parser = argparse.ArgumentParser(description="Answer a JSONL/CSV file of questions with the ticketing chatbot")
+    parser.add_argument("input", help="input .jsonl (one object per line) or .csv file")
+    parser.add_argument("output", help="output .jsonl file (appended to when resuming)")
+    parser.add_argument("--field", default="query", help="JSON key / CSV column holding the question")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=1, help="number of processes to shard the input across")
+    parser.add_argument("--sort-window", type=int, default=8, help="batches read at a time and sorted by length")
+    parser.add_argument("--restart", action="store_true", help="discard any checkpoint and start from the first line")
+    parser.add_argument("--model-dir", default=default_model_dir)
+    parser.add_argument("--backend", choices=backend_names, default="torch")
+    args = parser.parse_args()
+
+    engine_options = {
+        "model_dir": ensure_model_files(args.model_dir),
+        "backend": args.backend,
+        "torch_threads": default_torch_threads(),
+    }
+    started = time.perf_counter()
+    try:
+        totals = run(args.input, args.output, args.field, args.batch_size, args.workers, engine_options,
+                     args.sort_window, args.restart)
+    except CheckpointError as e:
+        parser.error(str(e))
+    elapsed = time.perf_counter() - started
+    answered = totals["answered"]
+    print(f"Answered {answered} questions in {elapsed:.1f}s ({answered / elapsed if elapsed else 0:.1f}/s)", file=sys.stderr)
+    if totals["skipped"]:
+        print(f"Skipped {totals['skipped']} lines without a question in field {args.field!r} "
+              f"(see the \"error\" lines in {args.output})", file=sys.stderr)
+    if totals["padded_tokens"]:
+        print(f"Padding efficiency: {totals['tokens'] / totals['padded_tokens']:.1%} "
+              f"({totals['tokens']} real of {totals['padded_tokens']} padded tokens)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+import torch
+
+from chatbot_engine import ChatbotEngine, capitalize_prompt, category_labels, example_queries, response_renderer
+from model_artifacts import default_model_dir, ensure_model_files
+
+# Latency benchmark and regression check for every stage of the request path:
+#
+#   ner         entity extraction (tiered extractor)
+#   tokenize    ALBERT tokenizer, padded batch
+#   forward     ALBERT forward pass on a pre-tokenized batch
+#   postprocess argmax + category_labels lookup on precomputed logits
+#   render      response template rendering
+#   end_to_end  ChatbotEngine.respond() with caching disabled
+#   first_chunk time until respond_streaming() yields its first chunk
+#   streamlit   one chat turn through Simple_Chatbot.py via AppTest (opt-in),
+#               over a long session to check that reruns don't slow down
+#               as the chat history grows
+#
+# Every stage runs over the bundled example_queries and a synthetic corpus of
+# varied length, at each batch size and torch thread count requested, and
+# reports p50/p95/p99 latency per call, throughput and peak RSS. Runs fully
+# offline once the model files are present.
+#
+#   python benchmark.py --output baseline.json
+#   python benchmark.py --baseline baseline.json --tolerance 0.25
+#
+# The second form exits non-zero if any stage's p50 got slower than the
+# baseline by more than the tolerance.
+
+stage_names = ["ner", "tokenize", "forward", "postprocess", "render", "end_to_end", "first_chunk"]
+
+synthetic_openers = ["How do I", "Can you tell me how to", "I would like to", "Please help me", "What is the way to"]
+synthetic_actions = [
+    "buy a ticket", "cancel my ticket", "get a refund", "transfer my ticket", "upgrade my ticket",
+    "change the name on my ticket", "pay for my order", "contact customer service", "find upcoming events",
+    "track my refund", "sell my ticket", "check the cancellation fee",
+]
+synthetic_details = [
+    "for the concert in London", "for the Coachella festival", "before the event next week",
+    "because my plans have changed and I can no longer attend", "using the mobile app",
+    "that I bought last month with my credit card", "for the football match in Madrid",
+    "as soon as possible since the show is this weekend",
+]
+
+
+# Deterministic questions from ~4 to ~60 words
+def synthetic_corpus(size=256, seed=0):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        words = [rng.choice(synthetic_openers), rng.choice(synthetic_actions)]
+        words += rng.sample(synthetic_details, rng.randint(0, len(synthetic_details)))
+        corpus.append(" ".join(words) + "?")
+    return corpus
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+# Reset and read the peak resident set size of this process (Linux)
+def reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mib():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def make_stages(engine):
+    # stage name -> (prepare(texts) -> argument, run(argument))
+    def tokenize(texts):
+        return engine.tokenizer(texts, padding=True, truncation=True, max_length=engine.max_length, return_tensors="pt")
+
+    def postprocess(logits):
+        return [category_labels.get(prediction, "Unknown Category") for prediction in torch.argmax(logits, dim=-1).tolist()]
+
+    def prepare_render(texts):
+        entities, _ = engine.extract_entities(texts)
+        return list(zip(postprocess(engine.forward(tokenize(texts))), entities))
+
+    return {
+        "ner": (lambda texts: texts, engine.extract_entities),
+        "tokenize": (lambda texts: texts, tokenize),
+        "forward": (tokenize, engine.forward),
+        "postprocess": (lambda texts: engine.forward(tokenize(texts)), postprocess),
+        "render": (prepare_render, lambda pairs: [response_renderer.render(intent, entities) for intent, entities in pairs]),
+        "end_to_end": (lambda texts: texts, engine.respond),
+    }
+
+
+def run_stage(prepare, run, corpus, batch_size, min_calls=20, warmup=2):
+    batches = [corpus[start:start + batch_size] for start in range(0, len(corpus), batch_size)]
+    calls = max(min_calls, len(batches))
+    while len(batches) < calls:
+        batches += batches
+    batches = batches[:calls]
+    arguments = [prepare(batch) for batch in batches]
+    for argument in arguments[:warmup]:
+        run(argument)
+    reset_peak_rss()
+    latencies = []
+    items = 0
+    started = time.perf_counter()
+    for batch, argument in zip(batches, arguments):
+        call_started = time.perf_counter()
+        run(argument)
+        latencies.append(time.perf_counter() - call_started)
+        items += len(batch)
+    elapsed = time.perf_counter() - started
+    return {
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "throughput_qps": items / elapsed if elapsed else 0.0,
+        "peak_rss_mib": peak_rss_mib(),
+    }
+
+
+def run_first_chunk_stage(engine, corpus, min_calls=20):
+    # Streaming is per question, so this stage ignores the batch size
+    latencies = []
+    totals = []
+    for text in (corpus * min_calls)[:max(min_calls, len(corpus))]:
+        started = time.perf_counter()
+        chunks = engine.respond_streaming(text)
+        next(chunks)
+        latencies.append(time.perf_counter() - started)
+        for _ in chunks:
+            pass
+        totals.append(time.perf_counter() - started)
+    return {
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "complete_p50_ms": percentile(totals, 50) * 1000,
+        "throughput_qps": len(totals) / sum(totals),
+        "peak_rss_mib": peak_rss_mib(),
+    }
+
+
+def run_streamlit_stage(turns=200, window=20):
+    # One session of `turns` chat turns. The example questions repeat, so
+    # after the first round every answer comes from the engine's cache and
+    # the time per turn is mostly the rerun itself; first/last_turns_p50_ms
+    # compare the start of the session with the end.
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), "Simple_Chatbot.py"), default_timeout=600)
+    app.run()
+    latencies = []
+    for query in (example_queries * turns)[:turns]:
+        started = time.perf_counter()
+        app.chat_input[0].set_value(query).run()
+        latencies.append(time.perf_counter() - started)
+    window = min(window, len(latencies))
+    return {
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "first_turns_p50_ms": percentile(latencies[:window], 50) * 1000,
+        "last_turns_p50_ms": percentile(latencies[-window:], 50) * 1000,
+        "turns": len(latencies),
+        "throughput_qps": len(latencies) / sum(latencies),
+        "peak_rss_mib": peak_rss_mib(),
+    }
+
+
+def run_benchmark(model_dir, batch_sizes, thread_counts, stages, corpus_size=256, min_calls=20):
+    engine = ChatbotEngine(model_dir, parallel=False)
+    stage_functions = make_stages(engine)
+    corpora = {
+        "examples": [capitalize_prompt(query) for query in example_queries],
+        "synthetic": synthetic_corpus(corpus_size),
+    }
+    results = []
+    for threads in thread_counts:
+        torch.set_num_threads(threads)
+        for corpus_name, corpus in corpora.items():
+            for stage in stages:
+                if stage == "first_chunk":
+                    result = run_first_chunk_stage(engine, corpus, min_calls)
+                    result.update(stage=stage, corpus=corpus_name, batch_size=1, threads=threads)
+                    results.append(result)
+                    continue
+                prepare, run = stage_functions[stage]
+                for batch_size in batch_sizes:
+                    result = run_stage(prepare, run, corpus, batch_size, min_calls)
+                    result.update(stage=stage, corpus=corpus_name, batch_size=batch_size, threads=threads)
+                    results.append(result)
+                    print(f"{stage:12s} {corpus_name:9s} bs={batch_size:<3d} threads={threads:<2d} "
+                          f"p50={result['p50_ms']:.2f}ms p99={result['p99_ms']:.2f}ms "
+                          f"{result['throughput_qps']:.1f} q/s", file=sys.stderr)
+    return results
+
+
+def result_key(result):
+    return f"{result['stage']}/{result['corpus']}/bs{result['batch_size']}/t{result['threads']}"
+
+
+# Stages whose p50 grew by more than tolerance (a fraction) over the baseline
+def find_regressions(results, baseline, tolerance):
+    previous = {result_key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = previous.get(result_key(result))
+        if before and result["p50_ms"] > before["p50_ms"] * (1 + tolerance):
+            regressions.append((result_key(result), before["p50_ms"], result["p50_ms"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every stage of the chatbot request path")
+    parser.add_argument("--model-dir", default=default_model_dir)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--threads", type=int, nargs="+", default=sorted({1, os.cpu_count() or 1}))
+    parser.add_argument("--stages", nargs="+", choices=stage_names, default=stage_names)
+    parser.add_argument("--corpus-size", type=int, default=256)
+    parser.add_argument("--min-calls", type=int, default=20, help="timed calls per stage/batch size")
+    parser.add_argument("--streamlit", action="store_true", help="also time chat turns through Simple_Chatbot.py with AppTest")
+    parser.add_argument("--streamlit-turns", type=int, default=200, help="chat turns in the --streamlit session")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown, as a fraction")
+    args = parser.parse_args()
+
+    results = run_benchmark(ensure_model_files(args.model_dir), args.batch_sizes, args.threads, args.stages,
+                            args.corpus_size, args.min_calls)
+    if args.streamlit:
+        result = run_streamlit_stage(args.streamlit_turns)
+        result.update(stage="streamlit", corpus="examples", batch_size=1, threads=torch.get_num_threads())
+        results.append(result)
+        print(f"streamlit    {result['turns']} turns: first p50={result['first_turns_p50_ms']:.2f}ms "
+              f"last p50={result['last_turns_p50_ms']:.2f}ms", file=sys.stderr)
+
+    report = {
+        "machine": {"platform": platform.platform(), "cpu_count": os.cpu_count(), "torch": torch.__version__},
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for key, before, after in regressions:
+            print(f"REGRESSION {key}: p50 {before:.2f}ms -> {after:.2f}ms", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"No stage regressed by more than {args.tolerance:.0%}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
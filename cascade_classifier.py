@@ -0,0 +1,216 @@
+import argparse
+import json
+import re
+import statistics
+import sys
+import time
+import zlib
+
+import numpy as np
+
+# First stage of a classifier cascade in front of ALBERT. Hashed word uni- and
+# bigrams feed a linear softmax model over the 25 intents; when its top
+# probability clears a calibrated threshold the answer is used as-is,
+# otherwise the question is escalated to the full 12-layer ALBERT pass.
+# Inference is pure numpy, a sparse dot product per question.
+#
+#   python cascade_classifier.py train --output cascade_model.npz
+#   python cascade_classifier.py bench --cascade-model cascade_model.npz
+#
+# train uses the same Bitext dataset and preprocessing as the fine-tuning
+# notebook (pandas and scikit-learn are only needed there). The threshold is
+# the lowest confidence at which the fast model's accepted answers still reach
+# --target-precision on a held-out split. bench reports how often the cascade
+# agrees with ALBERT alone and how much latency it saves: both legs run on one
+# warmed-up engine, alternating which goes first, with the token cache cleared
+# before each run, and the median of --repeats runs is compared.
+
+dataset_url = "hf://datasets/bitext/Bitext-events-ticketing-llm-chatbot-training-dataset/bitext-events-ticketing-llm-chatbot-training-dataset .csv"
+default_cascade_model = "./cascade_model.npz"
+
+token_pattern = re.compile(r"[a-z0-9']+")
+
+
+# Sparse hashed n-gram features: (indices, values), L2-normalized
+def hashed_features(text, num_features):
+    tokens = token_pattern.findall(text.lower())
+    grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    counts = {}
+    for gram in grams:
+        index = zlib.crc32(gram.encode("utf-8")) % num_features
+        counts[index] = counts.get(index, 0) + 1
+    if not counts:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    values = 1 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+    return indices, values / np.linalg.norm(values)
+
+
+class CascadeClassifier:
+
+    def __init__(self, weights, bias, threshold, num_features):
+        self.weights = weights        # (num_features, num_intents)
+        self.bias = bias              # (num_intents,)
+        self.threshold = float(threshold)
+        self.num_features = int(num_features)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data["weights"], data["bias"], data["threshold"], data["num_features"])
+
+    def save(self, path):
+        np.savez_compressed(path, weights=self.weights, bias=self.bias,
+                            threshold=self.threshold, num_features=self.num_features)
+
+    def logits(self, texts):
+        rows = np.empty((len(texts), len(self.bias)), dtype=np.float32)
+        for row, text in enumerate(texts):
+            indices, values = hashed_features(text, self.num_features)
+            rows[row] = values @ self.weights[indices] + self.bias
+        return rows
+
+    def predict(self, texts):
+        # (intent ids, confidences, logits) for every text
+        logits = self.logits(texts)
+        shifted = np.exp(logits - logits.max(axis=1, keepdims=True))
+        probabilities = shifted / shifted.sum(axis=1, keepdims=True)
+        return probabilities.argmax(axis=1), probabilities.max(axis=1), logits
+
+
+# Lowest threshold whose accepted predictions reach target precision
+def calibrate_threshold(confidences, correct, target_precision):
+    order = np.argsort(-confidences)
+    precision = np.cumsum(correct[order]) / np.arange(1, len(order) + 1)
+    passing = np.nonzero(precision >= target_precision)[0]
+    if len(passing) == 0:
+        return 1.0 + 1e-6  # Never confident enough: always escalate
+    return float(confidences[order][passing.max()])
+
+
+def load_training_data(path):
+    # Same cleaning as Notebook/Fine_tuning_ALBERT_Simple_Chatbot.ipynb
+    import pandas as pd
+    from chatbot_engine import capitalize_prompt, category_labels
+
+    df = pd.read_csv(path).drop_duplicates(ignore_index=True)
+    df["instruction"] = df["instruction"].str.replace("fucking ", "", regex=False).str.replace("fucking", "", regex=False)
+    df["instruction"] = df["instruction"].apply(capitalize_prompt)
+    label_ids = {name: intent_id for intent_id, name in category_labels.items()}
+    return df["instruction"].tolist(), [label_ids[intent] for intent in df["intent"]]
+
+
+def train(data_path, output, num_features=1 << 16, target_precision=0.99, seed=42):
+    from scipy.sparse import csr_matrix
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.model_selection import train_test_split
+
+    texts, labels = load_training_data(data_path)
+    train_texts, val_texts, train_labels, val_labels = train_test_split(
+        texts, labels, test_size=0.2, random_state=seed, stratify=labels
+    )
+
+    def matrix(batch):
+        data, indices, indptr = [], [], [0]
+        for text in batch:
+            row_indices, row_values = hashed_features(text, num_features)
+            indices.extend(row_indices)
+            data.extend(row_values)
+            indptr.append(len(indices))
+        return csr_matrix((data, indices, indptr), shape=(len(batch), num_features), dtype=np.float32)
+
+    model = LogisticRegression(C=10.0, max_iter=1000)
+    model.fit(matrix(train_texts), train_labels)
+
+    weights = np.ascontiguousarray(model.coef_.T, dtype=np.float32)
+    classifier = CascadeClassifier(weights, model.intercept_.astype(np.float32), 1.0, num_features)
+    predictions, confidences, _ = classifier.predict(val_texts)
+    correct = (predictions == np.array(val_labels)).astype(np.float64)
+    classifier.threshold = calibrate_threshold(confidences, correct, target_precision)
+    classifier.save(output)
+    accepted = confidences >= classifier.threshold
+    return {
+        "validation_accuracy": float(correct.mean()),
+        "threshold": classifier.threshold,
+        "accepted_rate": float(accepted.mean()),
+        "accepted_precision": float(correct[accepted].mean()) if accepted.any() else None,
+    }
+
+
+def bench(model_dir, cascade_model, texts, repeats=3, warmup=64):
+    from chatbot_engine import ChatbotEngine
+    from entity_extraction import TieredEntityExtractor
+
+    # Only classify() is timed, so skip loading the spaCy model
+    engine = ChatbotEngine(model_dir, TieredEntityExtractor(small_model=None), parallel=False)
+    cascade = CascadeClassifier.load(cascade_model)
+
+    def timed(use_cascade):
+        engine.cascade = cascade if use_cascade else None
+        engine.token_cache.clear()  # Neither leg reuses the other's encodings
+        started = time.perf_counter()
+        results = engine.classify(texts)
+        return results, time.perf_counter() - started
+
+    # First-call setup (torch kernels, allocator) stays out of the timings
+    for use_cascade in (False, True):
+        engine.cascade = cascade if use_cascade else None
+        engine.classify(texts[:warmup])
+    runs = {False: [], True: []}
+    results = {}
+    for repeat in range(repeats):
+        for use_cascade in ((False, True) if repeat % 2 == 0 else (True, False)):
+            results[use_cascade], seconds = timed(use_cascade)
+            runs[use_cascade].append(seconds)
+    reference, cascaded = results[False], results[True]
+    full_seconds = statistics.median(runs[False])
+    cascade_seconds = statistics.median(runs[True])
+
+    agreement = sum(a["intent_id"] == b["intent_id"] for a, b in zip(reference, cascaded)) / len(texts)
+    fast = sum(result["classifier"] == "cascade" for result in cascaded) / len(texts)
+    return {
+        "questions": len(texts),
+        "answered_by_fast_model": fast,
+        "agreement_with_albert": agreement,
+        "albert_ms_per_question": full_seconds * 1000 / len(texts),
+        "cascade_ms_per_question": cascade_seconds * 1000 / len(texts),
+        "latency_saved": 1 - cascade_seconds / full_seconds if full_seconds else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train or benchmark the fast first-stage intent classifier")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = subparsers.add_parser("train")
+    train_parser.add_argument("--data", default=dataset_url, help="Bitext CSV (path or URL)")
+    train_parser.add_argument("--output", default=default_cascade_model)
+    train_parser.add_argument("--num-features", type=int, default=1 << 16)
+    train_parser.add_argument("--target-precision", type=float, default=0.99)
+
+    bench_parser = subparsers.add_parser("bench")
+    bench_parser.add_argument("--cascade-model", default=default_cascade_model)
+    bench_parser.add_argument("--data", help="Bitext CSV to draw questions from (default: benchmark corpus)")
+    bench_parser.add_argument("--limit", type=int, default=2000)
+    bench_parser.add_argument("--repeats", type=int, default=3, help="timed runs per leg, alternating the order")
+    bench_parser.add_argument("--model-dir")
+
+    args = parser.parse_args()
+    if args.command == "train":
+        report = train(args.data, args.output, args.num_features, args.target_precision)
+    else:
+        from chatbot_engine import capitalize_prompt, example_queries
+        from model_artifacts import default_model_dir, ensure_model_files
+
+        if args.data:
+            texts = load_training_data(args.data)[0][:args.limit]
+        else:
+            from benchmark import synthetic_corpus
+            texts = [capitalize_prompt(query) for query in example_queries] + synthetic_corpus(args.limit)
+        report = bench(ensure_model_files(args.model_dir or default_model_dir), args.cascade_model, texts, args.repeats)
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
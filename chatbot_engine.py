@@ -0,0 +1,452 @@
+import itertools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+
+from entity_extraction import TieredEntityExtractor
+from instrumentation import metrics
+from model_artifacts import default_model_dir
+from model_backends import load_model_and_tokenizer
+from response_renderer import ResponseRenderer
+from semantic_cache import ShallowAlbertEncoder
+from tokenization import PaddingStats, TokenCache, default_max_length
+
+# Inference engine for the events ticketing chatbot. Loads the ALBERT intent
+# classifier, its tokenizer and the entity extractor once, and answers
+# whole lists of questions per call so the Streamlit app, offline scoring and
+# any serving front end share one code path.
+
+# Category labels mapping
+category_labels = {
+    0: "buy_ticket", 1: "cancel_ticket", 2: "change_personal_details_on_ticket", 3: "check_cancellation_fee", 4: "check_cancellation_policy",
+    5: "check_privacy_policy", 6: "check_refund_policy", 7: "customer_service", 8: "delivery_options", 9: "delivery_period",
+    10: "event_organizer", 11: "find_ticket", 12: "find_upcoming_events", 13: "get_refund", 14: "human_agent", 15: "information_about_tickets",
+    16: "information_about_type_events", 17: "pay", 18: "payment_methods", 19: "report_payment_issue", 20: "sell_ticket", 21: "track_cancellation",
+    22: "track_refund", 23: "transfer_ticket", 24: "upgrade_ticket"
+}
+
+# Response templates
+responses = {
+    'cancel_ticket': 'To cancel your ticket for the {{EVENT}} in {{CITY}}, please follow these steps:\n\n1. Access {{WEBSITE_URL}} and sign in to your account.\n2. Go to the {{CANCEL_TICKET_SECTION}} section.\n3. Locate your upcoming events and click on the {{EVENT}} in {{CITY}}.\n4. Select the {{CANCEL_TICKET_OPTION}} option.\n5. Complete the prompts to finalize your cancellation.\n\nIf any issues arise, do not hesitate to reach out to our customer support for further help.',
+    'buy_ticket': "To acquire a ticket for the {{EVENT}} in {{CITY}}, please undertake the following steps:\n\n1. Access {{WEBSITE_URL}} or launch the {{APP}}.\n2. Proceed to the {{TICKET_SECTION}} segment.\n3. Input the specifics of the desired event or performance.\n4. Identify and select the event from the listed search results.\n5. Specify the quantity of tickets and choose preferred seating arrangements (if applicable).\n6. Move to the checkout phase and provide the required payment details.\n\nUpon completion of your purchase, you will receive an email confirmation containing your ticket information.",
+    'change_personal_details_on_ticket': 'To update your personal details on your ticket, please adhere to the following steps:\n\n1. Go to {{WEBSITE_URL}} and sign in to your account.\n2. Proceed to the {{TICKET_SECTION}} section.\n3. Choose the specific ticket for the event in {{CITY}} that you want to amend.\n4. Click on the {{EDIT_BUTTON}} icon next to your personal details.\n5. Make the necessary amendments to your personal information.\n6. Confirm the changes by clicking {{SAVE_BUTTON}}.\n\nIf you face any issues, please contact our customer support using the contact form available on the website.',
+    'check_cancellation_fee': 'To verify the cancellation fee, kindly adhere to these steps:\n\n1. Access the {{WEBSITE_URL}}.\n2. Proceed to the {{CANCELLATION_FEE_SECTION}} segment.\n3. Identify the cancellation fee information in the {{CHECK_CANCELLATION_FEE_INFORMATION}} area.\n\nIf you require additional help, do not hesitate to reach out.',
+    'check_cancellation_policy': "For comprehensive details regarding our cancellation policy, please follow these instructions: \n\n1. Access our official website via the following link: {{WEBSITE_URL}}.\n2. Locate the {{CANCELLATION_POLICY_SECTION}} section within the main navigation menu.\n3. Select the {{CHECK_CANCELLATION_POLICY_OPTION}} option from the subsequent dropdown menu.\n4. Carefully read through the cancellation policy presented on the specific page.\n\nIf you require any additional information or have more inquiries, please do not hesitate to reach out to our customer support team for further assistance.",
+    'check_privacy_policy': "To access our privacy policy, please adhere to the following instructions:\n\n1. Navigate to {{WEBSITE_URL}}.\n2. Scroll to the bottom section of the homepage.\n3. Select the {{PRIVACY_POLICY_LINK}} link found in the footer area.\n\nBy following these steps, you will be redirected to our comprehensive privacy policy page containing all pertinent details.",
+    'check_refund_policy': "To access our refund policy, please follow the steps outlined below:\n\n1. Head over to our official site at {{WEBSITE_URL}}.\n2. Go to the {{REFUND_SECTION}} section.\n3. Select the {{REFUND_POLICY_LINK}} link.\n\nIf you require any additional help, feel free to reach out to our support team.",
+    'customer_service': 'For assistance from customer service, please adhere to the following directions:\n\n1. Access our web portal at {{WEBSITE_URL}}.\n2. Proceed to the {{CUSTOMER_SERVICE_SECTION}} tab.\n3. Complete and submit the inquiry form with the details of your request.\n\nOur customer service team will address your question promptly.',
+    'delivery_options': 'To view the available delivery options for your tickets, please follow these procedures:\n\n1. Navigate to our website at {{WEBSITE_URL}}.\n2. Sign into your existing account or register a new one if necessary.\n3. Access the {{DELIVERY_SECTION}} area.\n4. Choose the event for which you are buying tickets.\n5. During the purchase process, a list of delivery options will be available. Select the option that fits your requirements.\n\nFor further help, you can reach out to our customer support team using the contact information provided on our website.',
+    'delivery_period': 'To find out the delivery period for your tickets, please follow these instructions carefully:\n\n1. Go to {{WEBSITE_URL}}.\n2. Log into your account with your username and password.\n3. Proceed to the {{DELIVERY_SECTION}} section.\n4. Select the order or ticket number in question to view more details.\n5. Check the delivery period listed under the {{DELIVERY_PERIOD_INFORMATION}} section.\n\nIf you need any further help, feel free to reach out to customer support via the contact options available on the website.',
+    'event_organizer': 'To get in touch with an event planner, please follow these instructions:\n\n1. Access our website at {{WEBSITE_URL}}.\n2. Proceed to the {{CONTACT_SECTION}} page.\n3. Select the {{EVENT_ORGANIZER_OPTION}} feature.\n4. Complete the contact form with your information and inquiry.\n5. Submit the form by clicking the {{SEARCH_BUTTON}} button.\n\nIf you face any challenges, refer to the help section or reach out to customer support.',
+    'find_ticket': 'To find your tickets for the {{EVENT}} in {{CITY}}, please undertake the following steps:\n\n1. Please access {{WEBSITE_URL}} or launch the {{APP}} application.\n2. Sign in using your established credentials.\n3. Proceed to the {{TICKET_SECTION}} area.\n4. Identify the specific event within your list of purchased tickets.\n5. Select the event to review your ticket details.\n\nFor further assistance, feel free to reach out to our support team via the Help section on our website.',
+    'find_upcoming_events': 'To access details about upcoming events in {{CITY}} , follow these guidelines: \n\n1. Launch the {{APP}} or go to the {{WEBSITE_URL}}.\n2. Go to the {{EVENTS_SECTION}} section.\n3. Type the name of your city or town into the search field.\n4. Choose the type of events you are interested in, such as musical concerts, theatrical performances, or sports competitions.\n5. Hit the {{SEARCH_BUTTON}} to see a list of upcoming events.\n\nFollowing these steps should provide you with the necessary information. If you require additional help, please inform me.',
+    'get_refund': "To obtain a refund for your purchased event ticket, please adhere to the following instructions:\n\n1. Access {{WEBSITE_URL}}.\n2. Sign in to your account with your username and password.\n3. Go to {{REFUND_SECTION}}.\n4. Select the specific event for which you are requesting a refund.\n5. Press {{GET_REFUND_OPTION}} to start the refund procedure.\n6. Follow the on-screen directions to finalize your refund application.\n\nUpon submission of your request, a confirmation email will be sent to you detailing the status of your refund. If you experience any difficulties, do not hesitate to reach out to our support team for further help.",
+    'human_agent': 'To connect with a human agent, please adhere to the instructions provided below:\n\n1. Visit {{WEBSITE_URL}} and access your account by logging in.\n2. Find the {{CONTACT_SECTION}} area.\n3. Choose the option that allows you to speak with a human agent or representative.\n4. Proceed by following the given prompts to establish a connection with an agent.\n\nIf you face any issues along the way, please let us know so that we can offer further assistance.',
+    'information_about_tickets': 'For comprehensive information regarding tickets for an event, kindly proceed with the following steps:\n\n1. Go to {{WEBSITE_URL}}.\n2. Head over to the {{EVENTS_SECTION}} section.\n3. Identify and click on the event you wish to attend.\n4. Locate and select the {{TICKETS_TAB}} tab to review all the available ticket choices and their respective prices.\n\nThis procedure will equip you with all the relevant details about the tickets for the specified event.',
+    'information_about_type_events': "To explore the different types of events available, please follow the steps below:\n\n1. Go to {{WEBSITE_URL}}.\n2. Head to the {{EVENTS_SECTION}} section.\n3. Select the {{TYPE_EVENTS_OPTION}} option to access various event categories.\n4. Review the event types listed and choose the one that piques your interest.\n\nIf you need further help, feel free to request additional information.",
+    'pay': "To proceed with your payment, please adhere to the following steps:\n\n1. Access {{WEBSITE_URL}}.\n2. Sign into your account with your username and password.\n3. Go to the {{PAYMENT_SECTION}} area.\n4. Choose your desired {{PAYMENT_OPTION}}.\n5. Fill in the necessary payment or transfer information.\n6. Verify the details and finalize the transaction.\n\nFor any further help, feel free to reach out to our support team via the contact information available on our website.",
+    'payment_methods': "Thank you for your question regarding our payment options. Please follow these steps to review and utilize various payment methods on our website. \n\n1. Go to {{WEBSITE_URL}}.\n2. Proceed to the {{PAYMENT_SECTION}} area.\n3. Click on {{PAYMENT_OPTION}} to explore the available payment methods.\n4. Select your desired payment method and adhere to the instructions to finalize the payment.\n\nIf you need additional help, do not hesitate to reach out to our support team through the following link: {{SUPPORT_TEAM_LINK}}.",
+    'report_payment_issue': "If you are experiencing difficulties with your payment, please follow the steps outlined below to report the issue:\n\n1. Navigate to our support page at {{WEBSITE_URL}}.\n2. Access the {{PAYMENT_SECTION}} section.\n3. Choose the option labeled {{PAYMENT_ISSUE_OPTION}} for reporting payment problems.\n4. Complete the form with the required information, including your payment method and any error messages you have encountered.\n5. Submit the form so our team can investigate.\n\nOur support team will contact you as soon as possible to help resolve the issue.",
+    'sell_ticket': "Beginning the process of selling or exchanging your event ticket is simple. Please adhere to the following instructions:\n\n1. Go to {{WEBSITE_URL}} and enter your credentials to log in.\n2. Proceed to the {{TICKET_SECTION}} section.\n3. Identify the ticket you wish to sell or exchange.\n4. Press the {{SELL_TICKET_OPTION}} button.\n5. Fill in the necessary details and confirm your choice.\n\nBy completing these steps, you can efficiently manage your event tickets. If any complications arise, do not hesitate to seek further assistance.",
+    'track_cancellation': "To verify your cancellation status, please adhere to the following steps:\n\n1. Go to {{WEBSITE_URL}}.\n2. Sign in to your account using your username and password.\n3. Proceed to the {{CANCELLATION_SECTION}} section.\n4. Click on the {{CANCELLATION_OPTION}} option to check your cancellation status.\n\nFor any additional support, do not hesitate to contact customer service.	",
+    'track_refund': "To track the status of your refund, please follow these steps:\n\n1. Access our website at {{WEBSITE_URL}} and sign in to your account.\n2. Proceed to the {{REFUND_SECTION}} part within your account dashboard.\n3. Select the {{REFUND_STATUS_OPTION}} to view the present status of your refund.\n\nIf you have any additional inquiries or need more support, do not hesitate to reach out to our customer service team.	",
+    'transfer_ticket': "To send your ticket for an {{EVENT}} in {{CITY}}, please adhere to these instructions:\n\n1. Access your account on {{WEBSITE_URL}}.\n2. Proceed to the {{TICKET_SECTION}} section found in your profile.\n3. Locate the specific ticket you wish to send from your listed purchases.\n4. Select the {{TRANSFER_TICKET_OPTION}} option available there.\n5. Input the recipient's email and provide any necessary details.\n6. Validate the transfer and await a confirmation email.\n\nIf you face any difficulties, refer to the help section or reach out to customer support.	",
+    'upgrade_ticket': "To upgrade your ticket for the upcoming event, please follow these instructions:\n\n1. Go to {{WEBSITE_URL}}.\n2. Sign in with your username and password.\n3. Proceed to the {{TICKET_SECTION}} area.\n4. Find your current ticket purchase listed under {{UPGRADE_TICKET_INFORMATION}} and select the {{UPGRADE_TICKET_OPTION}} button.\n5. Adhere to the on-screen directions to select your intended upgrade and verify the modifications.\n\nIf you face any difficulties throughout this process, reach out to our support team for additional help."
+}
+
+# Define static placeholders
+static_placeholders = {
+    "{{APP}}": "<b>App</b>",
+    "{{ASSISTANCE_SECTION}}": "<b>Assistance Section</b>",
+    "{{CANCEL_TICKET_BUTTON}}": "<b>Cancel Ticket</b>",
+    "{{CANCEL_TICKET_OPTION}}": "<b>Cancel Ticket</b>",
+    "{{CANCEL_TICKET_SECTION}}": "<b>Ticket Cancellation</b>",
+    "{{CANCELLATION_FEE_INFORMATION}}": "<b>Cancellation Fee Information</b>",
+    "{{CANCELLATION_FEE_SECTION}}": "<b>Cancellation Fee</b>",
+    "{{CANCELLATION_OPTION}}": "<b>Cancellation</b>",
+    "{{CANCELLATION_POLICY_SECTION}}": "<b>Cancellation Policy</b>",
+    "{{CANCELLATION_SECTION}}": "<b>Track Cancellation</b>",
+    "{{CHECK_CANCELLATION_FEE_INFORMATION}}": "<b>Check Cancellation Fee Information</b>",
+    "{{CHECK_CANCELLATION_FEE_OPTION}}": "<b>Check Cancellation Fee</b>",
+    "{{CHECK_CANCELLATION_POLICY_OPTION}}": "<b>Check Cancellation Policy</b>",
+    "{{CHECK_PRIVACY_POLICY_OPTION}}": "<b>Check Privacy Policy</b>",
+    "{{CHECK_REFUND_POLICY_OPTION}}": "<b>Check Refund Policy</b>",
+    "{{CONNECT_WITH_ORGANIZER}}": "<b>Connect with Organizer</b>",
+    "{{CONTACT_SECTION}}": "<b>Contact</b>",
+    "{{CONTACT_SUPPORT_LINK}}": "www.support-team.com",
+    "{{CURRENT_TICKET_DETAILS}}": "<b>Current Ticket Details</b>",
+    "{{CUSTOMER_SERVICE_SECTION}}": "<b>Customer Service</b>",
+    "{{CUSTOMER_SUPPORT_PAGE}}": "<b>Customer Support</b>",
+    "{{CUSTOMER_SUPPORT_PORTAL}}": "<b>Customer Support</b>",
+    "{{CUSTOMER_SUPPORT_SECTION}}": "<b>Customer Support</b>",
+    "{{DELIVERY_PERIOD_INFORMATION}}": "<b>Delivery Period</b>",
+    "{{DELIVERY_SECTION}}": "<b>Delivery</b>",
+    "{{EDIT_BUTTON}}": "<b>Edit</b>",
+    "{{EVENT_ORGANIZER_OPTION}}": "<b>Event Organizer</b>",
+    "{{EVENTS_PAGE}}": "<b>Events</b>",
+    "{{EVENTS_SECTION}}": "<b>Events</b>",
+    "{{FIND_TICKET_OPTION}}": "<b>Find Ticket</b>",
+    "{{FIND_UPCOMING_EVENTS_OPTION}}": "<b>Find Upcoming Events</b>",
+    "{{GET_REFUND_BUTTON}}": "<b>Get Refund</b>",
+    "{{GET_REFUND_OPTION}}": "<b>Get Refund</b>",
+    "{{HELP_SECTION}}": "<b>Help</b>",
+    "{{PAYMENT_ISSUE_OPTION}}": "<b>Payment Issue</b>",
+    "{{PAYMENT_METHOD}}": "<b>Payment</b>",
+    "{{PAYMENT_OPTION}}": "<b>Payment</b>",
+    "{{PAYMENT_SECTION}}": "<b>Payments</b>",
+    "{{PAYMENTS_HELP_SECTION}}": "<b>Payments Help</b>",
+    "{{PAYMENTS_PAGE}}": "<b>Payments</b>",
+    "{{PRIVACY_POLICY_LINK}}": "<b>Privacy Policy</b>",
+    "{{REFUND_OPTION}}": "<b>Refund</b>",
+    "{{REFUND_POLICY_LINK}}": "<b>Refund Policy</b>",
+    "{{REFUND_SECTION}}": "<b>Refund</b>",
+    "{{REFUND_STATUS_OPTION}}": "<b>Refund Status</b>",
+    "{{REPORT_PAYMENT_PROBLEM}}": "<b>Report Payment</b>",
+    "{{SAVE_BUTTON}}": "<b>Save</b>",
+    "{{SEARCH_BUTTON}}": "<b>Search</b>",
+    "{{SELL_TICKET_OPTION}}": "<b>Sell Ticket</b>",
+    "{{SEND_BUTTON}}": "<b>Send</b>",
+    "{{SUPPORT_ SECTION}}": "<b>Support</b>",
+    "{{SUPPORT_CONTACT_LINK}}": "www.support-team.com",
+    "{{SUPPORT_SECTION}}": "<b>Support</b>",
+    "{{SUPPORT_TEAM_LINK}}": "www.support-team.com",
+    "{{TICKET_AVAILABILITY_TAB}}": "<b>Ticket Availability</b>",
+    "{{TICKET_DETAILS}}": "<b>Ticket Details</b>",
+    "{{TICKET_INFORMATION}}": "<b>Ticket Information</b>",
+    "{{TICKET_INFORMATION_PAGE}}": "<b>Ticket Information</b>",
+    "{{TICKET_MANAGEMENT}}": "<b>Ticket Management</b>",
+    "{{TICKET_OPTIONS}}": "<b>Ticket Options</b>",
+    "{{TICKET_SECTION}}": "<b>Ticketing</b>",
+    "{{TICKET_STATUS_TAB}}": "<b>Ticket Status</b>",
+    "{{TICKET_TRANSFER_TAB}}": "<b>Ticket Transfer</b>",
+    "{{TICKETING_PAGE}}": "<b>Ticketing</b>",
+    "{{TICKETS_TAB}}": "<b>Tickets</b>",
+    "{{TRANSFER_TICKET_BUTTON}}": "<b>Transfer Ticket</b>",
+    "{{TRANSFER_TICKET_OPTION}}": "<b>Transfer Ticket</b>",
+    "{{TYPE_EVENTS_OPTION}}": "<b>Type Events</b>",
+    "{{UPGRADE_OPTION}}": "<b>Upgrade</b>",
+    "{{UPGRADE_TICKET_BUTTON}}": "<b>Upgrade Ticket</b>",
+    "{{UPGRADE_TICKET_INFORMATION}}": "<b>Ticket Upgradation</b>",
+    "{{UPGRADE_TICKET_OPTION}}": "<b>Upgrade Ticket</b>",
+    "{{VIEW_CANCELLATION_POLICY}}": "<b>View Cancellation Policy</b>",
+    "{{VIEW_PAYMENT_METHODS}}": "<b>View Payment Methods</b>",
+    "{{WEBSITE_URL}}": "www.events-ticketing.com"
+}
+
+# Fallback reply when the predicted intent has no template
+default_response = "Sorry, I didn't understand. Could you rephrase?"
+
+# Example queries offered in the UI dropdown (also handy for warm-up and benchmarks)
+example_queries = [
+    "How do I buy a ticket?",
+    "What is the cancellation policy?",
+    "I want to get a refund for my ticket.",
+    "How can I change my ticket details?",
+    "Tell me about upcoming events in London.",
+    "How to contact customer service?",
+    "What payment methods are accepted?",
+    "I need to report a payment issue.",
+    "Can I sell my ticket?",
+    "How to track my refund?",
+]
+
+# Capitalize the first letter, the same way the training data was prepared
+def capitalize_prompt(prompt):
+    return prompt[0].upper() + prompt[1:] if prompt else prompt
+
+# Function to replace placeholders
+def replace_placeholders(response, dynamic_placeholders, static_placeholders):
+    for placeholder, value in static_placeholders.items():
+        response = response.replace(placeholder, value)
+    for placeholder, value in dynamic_placeholders.items():
+        response = response.replace(placeholder, value)
+    # Add a fallback for any missed placeholders
+    response = response.replace("{{EVENT}}", "the event")
+    response = response.replace("{{CITY}}", "the city")
+    return response
+
+# Templates compiled once at import; raises if a template has an unknown placeholder
+response_renderer = ResponseRenderer(responses, static_placeholders)
+
+# Torch threads for an engine that shares the machine with its own NER thread:
+# every core but the ones left to the NER
+def default_torch_threads(ner_threads=1):
+    return max(1, (os.cpu_count() or 1) - ner_threads)
+
+class ChatbotEngine:
+    # Owns the model, tokenizer and entity extractor. classify()/respond() take
+    # a list of questions and run them through the classifier in batches that
+    # are grouped by token length, so each batch is padded only to its own
+    # longest member instead of the longest question overall.
+    #
+    # Entity extraction and classification are independent, so with
+    # parallel=True respond() runs the NER on a background thread while the
+    # classifier runs on the calling one, and only joins the two for
+    # rendering. ner_processes is handed to spaCy's nlp.pipe(n_process=...)
+    # for large batch workloads. torch_threads, when given, sets torch's
+    # intra-op thread count; that setting is process-wide, so it is left to
+    # the entry points (default_torch_threads() keeps a core for the NER).
+    #
+    # backend picks how the classifier runs (see model_backends.py), and
+    # mmap_weights shares the weights between processes (see
+    # shared_weights.py). An optional CascadeClassifier (see
+    # cascade_classifier.py) answers confidently classified questions before
+    # they reach ALBERT. An
+    # optional ResponseCache (see response_cache.py) short-circuits repeated
+    # questions before either model runs, and an optional SemanticCache (see
+    # semantic_cache.py) reuses the intent of a close paraphrase.
+    #
+    # Questions are truncated to max_length tokens, and the encodings of the
+    # last token_cache_size distinct questions are kept (see tokenization.py).
+    # padding_stats counts how much of each padded batch is real tokens.
+
+    def __init__(self, model_dir, entity_extractor=None, device="cpu", batch_size=32,
+                 parallel=True, ner_processes=1, backend="torch", cache=None,
+                 semantic_cache=None, mmap_weights=False, cascade=None, max_length=default_max_length,
+                 token_cache_size=4096, torch_threads=None):
+        self.batch_size = batch_size
+        self.cache = cache
+        self.semantic_cache = semantic_cache
+        self.cascade = cascade
+        self.ner_processes = ner_processes
+        self._ner_executor = None
+        if torch_threads:
+            torch.set_num_threads(torch_threads)
+        if parallel:
+            self._ner_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ner")
+        self.model_dir = model_dir
+        self.backend, self.tokenizer = load_model_and_tokenizer(model_dir, backend, device, mmap_weights=mmap_weights)
+        self.max_length = max_length
+        self.token_cache = TokenCache(self.tokenizer, max_length, token_cache_size)
+        self.padding_stats = PaddingStats()
+        self.entity_extractor = entity_extractor or TieredEntityExtractor()
+        self.semantic_encoder = None
+        if semantic_cache is not None:
+            self.semantic_encoder = ShallowAlbertEncoder(getattr(self.backend, "model", None) or model_dir)
+
+    def _length_buckets(self, lengths, batch_size):
+        # Sort by token count and cut into consecutive slices of batch_size
+        order = sorted(range(len(lengths)), key=lengths.__getitem__)
+        for start in range(0, len(order), batch_size):
+            yield order[start:start + batch_size]
+
+    def forward(self, batch):
+        # One padded forward pass; returns the logits tensor on CPU
+        return self.backend(batch)
+
+    def classify(self, texts, batch_size=None):
+        texts = list(texts)
+        if self.cascade is None:
+            return self._classify_albert(texts, batch_size)
+        with metrics.span("cascade"):
+            predictions, confidences, logits = self.cascade.predict(texts)
+        results = [None] * len(texts)
+        escalated = []
+        for i, (prediction, confidence) in enumerate(zip(predictions.tolist(), confidences.tolist())):
+            if confidence < self.cascade.threshold:
+                escalated.append(i)
+                continue
+            results[i] = {
+                "intent_id": prediction,
+                "intent": category_labels.get(prediction, "Unknown Category"),
+                "confidence": confidence,
+                "logits": logits[i].tolist(),
+                "classifier": "cascade",
+            }
+            metrics.inc("chatbot_intent_total", {"intent": results[i]["intent"]})
+        if escalated:
+            for i, result in zip(escalated, self._classify_albert([texts[i] for i in escalated], batch_size)):
+                results[i] = result
+        return results
+
+    def _classify_albert(self, texts, batch_size=None):
+        batch_size = batch_size or self.batch_size
+        if not texts:
+            return []
+        with metrics.span("tokenize"):
+            encodings = self.token_cache.encode(texts)
+        lengths = [len(encoding["input_ids"]) for encoding in encodings]
+        if metrics.enabled:
+            for length in lengths:
+                metrics.observe("chatbot_token_length", length)
+        results = [None] * len(texts)
+        for indices in self._length_buckets(lengths, batch_size):
+            batch = self.tokenizer.pad([encodings[i] for i in indices], padding=True, return_tensors="pt")
+            bucket_lengths = [lengths[i] for i in indices]
+            self.padding_stats.add(bucket_lengths)
+            metrics.observe("chatbot_batch_size", len(indices))
+            metrics.inc("chatbot_tokens_total", {"kind": "real"}, sum(bucket_lengths))
+            metrics.inc("chatbot_tokens_total", {"kind": "padding"}, len(indices) * max(bucket_lengths) - sum(bucket_lengths))
+            with metrics.span("forward"):
+                logits = self.forward(batch)
+            probabilities = torch.softmax(logits, dim=-1)
+            confidences, predictions = probabilities.max(dim=-1)
+            for row, i in enumerate(indices):
+                prediction = predictions[row].item()
+                results[i] = {
+                    "intent_id": prediction,
+                    "intent": category_labels.get(prediction, "Unknown Category"),
+                    "confidence": confidences[row].item(),
+                    "logits": logits[row].tolist(),
+                    "classifier": "albert",
+                }
+                metrics.inc("chatbot_intent_total", {"intent": results[i]["intent"]})
+        return results
+
+    def extract_entities(self, texts, batch_size=None):
+        # Returns (placeholders, reports), one entry per text
+        with metrics.span("entity_extraction"):
+            return self.entity_extractor.extract_batch(texts, batch_size or self.batch_size, n_process=self.ner_processes)
+
+    def render(self, intent, dynamic_placeholders):
+        with metrics.span("render"):
+            return response_renderer.render(intent, dynamic_placeholders, default_response)
+
+    def analyze(self, texts, batch_size=None):
+        # Intent and entities for every text, without rendering
+        texts = list(texts)
+        if self._ner_executor is not None:
+            entities_future = self._ner_executor.submit(self.extract_entities, texts, batch_size)
+            predictions = self.classify(texts, batch_size)
+            entities, reports = entities_future.result()
+        else:
+            entities, reports = self.extract_entities(texts, batch_size)
+            predictions = self.classify(texts, batch_size)
+        results = []
+        for prediction, dynamic_placeholders, report in zip(predictions, entities, reports):
+            result = dict(prediction)
+            result["entities"] = dynamic_placeholders
+            result["entity_tier"] = report["tier"]
+            result["entity_ms"] = report["ms"]
+            results.append(result)
+        return results
+
+    def embed(self, texts, batch_size=None):
+        # Sentence embeddings from the shallow encoder, one row per text. The
+        # encodings go through the token cache, so a question that misses the
+        # semantic cache is not tokenized again by classify().
+        if self.semantic_encoder is None:
+            self.semantic_encoder = ShallowAlbertEncoder(getattr(self.backend, "model", None) or self.model_dir)
+        batch_size = batch_size or self.batch_size
+        with metrics.span("tokenize"):
+            encodings = self.token_cache.encode(texts)
+        rows = []
+        for start in range(0, len(texts), batch_size):
+            batch = self.tokenizer.pad(encodings[start:start + batch_size], padding=True, return_tensors="pt")
+            rows.append(self.semantic_encoder.embed(batch))
+        return np.concatenate(rows)
+
+    def _semantic_lookup(self, texts, missing, analyses, sources, batch_size):
+        # Fill analyses for texts whose paraphrase is in the semantic cache.
+        # Entities are specific to each question, so they are always extracted
+        # again; only the intent is reused. Returns the indices still missing
+        # and their embeddings, to be added once the full model has run.
+        embeddings = self.embed([texts[i] for i in missing], batch_size)
+        matches = self.semantic_cache.lookup(embeddings)
+        hits = [i for i, match in zip(missing, matches) if match is not None]
+        if hits:
+            entities, reports = self.extract_entities([texts[i] for i in hits], batch_size)
+            hit_matches = [match for match in matches if match is not None]
+            for i, match, dynamic_placeholders, report in zip(hits, hit_matches, entities, reports):
+                analysis = dict(match)
+                analysis["entities"] = dynamic_placeholders
+                analysis["entity_tier"] = report["tier"]
+                analysis["entity_ms"] = report["ms"]
+                analyses[i] = analysis
+                sources[i] = "semantic_cache"
+                if self.cache is not None:
+                    self.cache.put(texts[i], analysis)
+        pending = {i: embedding for i, embedding, match in zip(missing, embeddings, matches) if match is None}
+        return list(pending), pending
+
+    def respond(self, texts, batch_size=None):
+        texts = list(texts)
+        analyses = [None] * len(texts)
+        sources = ["model"] * len(texts)
+        if self.cache is not None:
+            analyses = [self.cache.get(text) for text in texts]
+            sources = ["cache" if analysis is not None else "model" for analysis in analyses]
+        missing = [i for i, analysis in enumerate(analyses) if analysis is None]
+        pending_embeddings = {}
+        if missing and self.semantic_cache is not None:
+            missing, pending_embeddings = self._semantic_lookup(texts, missing, analyses, sources, batch_size)
+        if missing:
+            for i, analysis in zip(missing, self.analyze([texts[i] for i in missing], batch_size)):
+                analyses[i] = analysis
+                if self.cache is not None:
+                    self.cache.put(texts[i], analysis)
+                if i in pending_embeddings:
+                    prediction = {name: analysis[name] for name in ("intent_id", "intent", "confidence", "logits", "classifier")}
+                    self.semantic_cache.add(pending_embeddings[i], prediction)
+        results = []
+        for analysis, source in zip(analyses, sources):
+            metrics.inc("chatbot_cache_total", {"source": source})
+            result = dict(analysis)
+            result["source"] = source
+            result["cached"] = source != "model"
+            result["response"] = self.render(analysis["intent"], analysis["entities"])
+            results.append(result)
+        return results
+
+    def respond_streaming(self, text, result=None):
+        # Answer one question as a generator of text chunks for the chat UI.
+        # Entity extraction runs in the background while the intent is
+        # looked up in the semantic cache or classified; the part of the
+        # template before the first entity slot is yielded as soon as the
+        # intent is known, and the rest once the entities arrive. If given,
+        # the dict result is updated with the analysis (intent, entities,
+        # source, ...) once the last chunk has been yielded.
+        if self.cache is not None:
+            analysis = self.cache.get(text)
+            if analysis is not None:
+                metrics.inc("chatbot_cache_total", {"source": "cache"})
+                yield self.render(analysis["intent"], analysis["entities"])
+                if result is not None:
+                    result.update(analysis, source="cache", cached=True)
+                return
+        entities_future = None
+        if self._ner_executor is not None:
+            entities_future = self._ner_executor.submit(self.extract_entities, [text])
+        embedding = match = None
+        if self.semantic_cache is not None:
+            embedding = self.embed([text])
+            match = self.semantic_cache.lookup(embedding)[0]
+        source = "model" if match is None else "semantic_cache"
+        metrics.inc("chatbot_cache_total", {"source": source})
+        analysis = dict(match if match is not None else self.classify([text])[0])
+
+        def get_placeholders():
+            entities, reports = entities_future.result() if entities_future else self.extract_entities([text])
+            analysis["entities"] = entities[0]
+            analysis["entity_tier"] = reports[0]["tier"]
+            analysis["entity_ms"] = reports[0]["ms"]
+            return entities[0]
+
+        yield from response_renderer.iter_render(analysis["intent"], get_placeholders, default_response)
+        if "entities" not in analysis:
+            get_placeholders()  # Template without entity slots: still cache the entities
+        if self.cache is not None:
+            self.cache.put(text, analysis)
+        if embedding is not None and match is None:
+            prediction = {name: analysis[name] for name in ("intent_id", "intent", "confidence", "logits", "classifier")}
+            self.semantic_cache.add(embedding[0], prediction)
+        if result is not None:
+            result.update(analysis, source=source, cached=source != "model")
+
+    def warm_cache(self, texts):
+        # Pre-answer known questions (e.g. example_queries) at startup
+        if self.cache is not None:
+            self.respond([capitalize_prompt(text) for text in texts])
+
+    def respond_stream(self, texts, batch_size=None):
+        # Lazily answer an iterable of questions chunk by chunk; the NER for
+        # a chunk streams through nlp.pipe while the classifier batches run
+        batch_size = batch_size or self.batch_size
+        texts = iter(texts)
+        while True:
+            chunk = list(itertools.islice(texts, batch_size))
+            if not chunk:
+                break
+            yield from self.respond(chunk, batch_size)
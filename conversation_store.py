@@ -0,0 +1,385 @@
+import argparse
+import atexit
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+
+# Chat history for every session, kept outside st.session_state.
+#
+# A turn is stored as (query, intent id, entity ids, timestamp). The answer
+# text is fully determined by the intent and the entities, so it is never
+# stored; the app re-renders it from the response templates when the turn is
+# shown. Entity values ("{{CITY}}" -> "<b>London</b>") repeat across sessions,
+# so each distinct one is interned once per store and turns refer to it by id.
+#
+#   memory  - MemoryConversationStore: per-process, at most max_turns per
+#             session and max_sessions sessions (least recently used first out)
+#   sqlite  - SQLiteConversationStore: a database file in WAL mode, so history
+#             survives restarts and is shared by every app process on the host.
+#             Turns are buffered and written in one transaction per batch, and
+#             each written session is pruned to its last max_turns turns.
+#
+# Both have the same methods; open_conversation_store() picks one from a
+# setting ("memory" or a .db path). Run this module to export a database or
+# to load-test a backend:
+#
+#   python conversation_store.py export chat_history.db turns.jsonl --responses
+#   python conversation_store.py bench --store chat_history.db --sessions 5000
+
+Turn = namedtuple("Turn", ["query", "intent_id", "entities", "timestamp"])
+
+
+class EntityTable:
+    # Two-way mapping between (slot, value) pairs and small integer ids. Every
+    # stored turn holds one reference to each of its entities; an entity is
+    # dropped (and its id reused) once the last turn using it is released.
+
+    def __init__(self):
+        self.ids = {}
+        self.values = []
+        self.refs = []
+        self._free = []
+
+    def intern(self, slot, value):
+        entity_id = self.ids.get((slot, value))
+        if entity_id is None:
+            if self._free:
+                entity_id = self._free.pop()
+                self.values[entity_id] = (slot, value)
+            else:
+                entity_id = len(self.values)
+                self.values.append((slot, value))
+                self.refs.append(0)
+            self.ids[(slot, value)] = entity_id
+        self.refs[entity_id] += 1
+        return entity_id
+
+    def release(self, entity_ids):
+        for entity_id in entity_ids:
+            self.refs[entity_id] -= 1
+            if self.refs[entity_id] == 0:
+                del self.ids[self.values[entity_id]]
+                self.values[entity_id] = None
+                self._free.append(entity_id)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def decode(self, entity_ids):
+        return dict(self.values[entity_id] for entity_id in entity_ids)
+
+
+class MemoryConversationStore:
+
+    def __init__(self, max_turns=200, max_sessions=10000, clock=time.time):
+        self.max_turns = max_turns
+        self.max_sessions = max_sessions
+        self.clock = clock
+        self._entities = EntityTable()
+        self._sessions = OrderedDict()  # session id -> deque of compact turns
+        self._lock = threading.Lock()
+
+    def append(self, session_id, query, intent_id, entities, timestamp=None):
+        with self._lock:
+            entity_ids = tuple(self._entities.intern(slot, value) for slot, value in entities.items())
+            turns = self._sessions.get(session_id)
+            if turns is None:
+                turns = self._sessions[session_id] = deque(maxlen=self.max_turns)
+                while len(self._sessions) > self.max_sessions:
+                    self._release(self._sessions.popitem(last=False)[1])
+            self._sessions.move_to_end(session_id)
+            if len(turns) == turns.maxlen:
+                self._entities.release(turns[0][2])  # About to drop off the front
+            turns.append((query, intent_id, entity_ids, timestamp or self.clock()))
+
+    def _release(self, turns):
+        for turn in turns:
+            self._entities.release(turn[2])
+
+    def count(self, session_id):
+        with self._lock:
+            return len(self._sessions.get(session_id, ()))
+
+    def recent(self, session_id, limit):
+        # The last `limit` turns of a session, oldest first
+        with self._lock:
+            turns = self._sessions.get(session_id, ())
+            selected = list(turns)[-limit:] if limit > 0 else []
+            return [Turn(query, intent_id, self._entities.decode(entity_ids), timestamp)
+                    for query, intent_id, entity_ids, timestamp in selected]
+
+    def clear(self, session_id):
+        with self._lock:
+            self._release(self._sessions.pop(session_id, ()))
+
+    def iter_turns(self):
+        # (session id, Turn) for every stored turn, session by session
+        with self._lock:
+            sessions = [(session_id, list(turns)) for session_id, turns in self._sessions.items()]
+        for session_id, turns in sessions:
+            for query, intent_id, entity_ids, timestamp in turns:
+                yield session_id, Turn(query, intent_id, self._entities.decode(entity_ids), timestamp)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SQLiteConversationStore:
+
+    schema = """
+    CREATE TABLE IF NOT EXISTS entities (
+        id INTEGER PRIMARY KEY,
+        slot TEXT NOT NULL,
+        value TEXT NOT NULL,
+        UNIQUE (slot, value)
+    );
+    CREATE TABLE IF NOT EXISTS turns (
+        id INTEGER PRIMARY KEY,
+        session TEXT NOT NULL,
+        query TEXT NOT NULL,
+        intent_id INTEGER NOT NULL,
+        entity_ids TEXT NOT NULL,
+        timestamp REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS turns_by_session ON turns (session, id);
+    """
+
+    def __init__(self, path, max_turns=200, batch_size=256, flush_interval=0.05, entity_cache_size=10000,
+                 clock=time.time):
+        self.path = path
+        self.max_turns = max_turns
+        self.batch_size = batch_size
+        self.entity_cache_size = entity_cache_size
+        self.clock = clock
+        # One connection shared by the Streamlit session threads, guarded by
+        # _lock; iter_turns() opens its own so an export doesn't block writes
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(self.schema)
+        # Caches of the entities table, emptied when they reach entity_cache_size
+        self._entity_ids = {}     # (slot, value) -> row id
+        self._entity_values = {}  # row id -> (slot, value)
+        self._pending = []        # turns not written yet
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_periodically, args=(flush_interval,),
+                                         name="conversation-store", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def _entity_row(self, slot, value):
+        # Row id of an entity, inserting it on first use. Entities are few and
+        # written straight away, so processes sharing the file agree on ids.
+        row_id = self._entity_ids.get((slot, value))
+        if row_id is None:
+            self._trim_entity_cache()
+            self._db.execute("INSERT OR IGNORE INTO entities (slot, value) VALUES (?, ?)", (slot, value))
+            row_id = self._db.execute("SELECT id FROM entities WHERE slot = ? AND value = ?", (slot, value)).fetchone()[0]
+            self._entity_ids[(slot, value)] = row_id
+            self._entity_values[row_id] = (slot, value)
+        return row_id
+
+    def _trim_entity_cache(self):
+        if len(self._entity_ids) >= self.entity_cache_size:
+            self._entity_ids.clear()
+            self._entity_values.clear()
+
+    def _decode_entities(self, entity_ids):
+        if not entity_ids:
+            return {}
+        entities = {}
+        for row_id in map(int, entity_ids.split(",")):
+            entity = self._entity_values.get(row_id)
+            if entity is None:  # Added by another process, or trimmed from the cache
+                self._trim_entity_cache()
+                entity = self._entity_values[row_id] = self._db.execute(
+                    "SELECT slot, value FROM entities WHERE id = ?", (row_id,)).fetchone()
+                self._entity_ids[entity] = row_id
+            slot, value = entity
+            entities[slot] = value
+        return entities
+
+    def append(self, session_id, query, intent_id, entities, timestamp=None):
+        with self._lock:
+            entity_ids = ",".join(str(self._entity_row(slot, value)) for slot, value in entities.items())
+            self._pending.append((session_id, query, intent_id, entity_ids, timestamp or self.clock()))
+            if len(self._pending) >= self.batch_size:
+                self._write_pending()
+
+    def _write_pending(self):
+        if not self._pending:
+            return
+        with self._db:
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "INSERT INTO turns (session, query, intent_id, entity_ids, timestamp) VALUES (?, ?, ?, ?, ?)",
+                self._pending,
+            )
+            if self.max_turns:
+                # Keep the newest max_turns turns of every session just written
+                self._db.executemany(
+                    "DELETE FROM turns WHERE session = ? AND id <= "
+                    "(SELECT id FROM turns WHERE session = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                    [(session_id, session_id, self.max_turns) for session_id in {row[0] for row in self._pending}],
+                )
+        self._pending = []
+
+    def flush(self):
+        with self._lock:
+            self._write_pending()
+
+    def _flush_periodically(self, interval):
+        while not self._closed.wait(interval):
+            self.flush()
+
+    def _read(self, session_id, sql, parameters):
+        # Make this session's own buffered turns visible before reading
+        with self._lock:
+            if any(row[0] == session_id for row in self._pending):
+                self._write_pending()
+            return self._db.execute(sql, parameters).fetchall()
+
+    def count(self, session_id):
+        return self._read(session_id, "SELECT COUNT(*) FROM turns WHERE session = ?", (session_id,))[0][0]
+
+    def recent(self, session_id, limit):
+        rows = self._read(
+            session_id,
+            "SELECT query, intent_id, entity_ids, timestamp FROM turns WHERE session = ? ORDER BY id DESC LIMIT ?",
+            (session_id, limit),
+        )
+        with self._lock:
+            return [Turn(query, intent_id, self._decode_entities(entity_ids), timestamp)
+                    for query, intent_id, entity_ids, timestamp in reversed(rows)]
+
+    def clear(self, session_id):
+        with self._lock:
+            self._pending = [row for row in self._pending if row[0] != session_id]
+            self._db.execute("DELETE FROM turns WHERE session = ?", (session_id,))
+
+    def iter_turns(self, fetch_size=1000):
+        # (session id, Turn) for every stored turn, in insertion order,
+        # streamed from a separate read connection
+        self.flush()
+        db = sqlite3.connect(self.path)
+        try:
+            entities = {row_id: (slot, value) for row_id, slot, value in db.execute("SELECT id, slot, value FROM entities")}
+            cursor = db.execute("SELECT session, query, intent_id, entity_ids, timestamp FROM turns ORDER BY id")
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                for session_id, query, intent_id, entity_ids, timestamp in rows:
+                    decoded = dict(entities[int(row_id)] for row_id in entity_ids.split(",")) if entity_ids else {}
+                    yield session_id, Turn(query, intent_id, decoded, timestamp)
+        finally:
+            db.close()
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._flusher.join()
+        with self._lock:
+            self._write_pending()
+            self._db.close()
+
+
+# "memory" for the in-process store, anything else is a SQLite database path
+def open_conversation_store(location="memory", max_turns=200):
+    if location == "memory":
+        return MemoryConversationStore(max_turns=max_turns)
+    return SQLiteConversationStore(location, max_turns=max_turns)
+
+
+def export_jsonl(store, out, responses=False):
+    # Write every turn as one JSON line; with responses=True the intent name
+    # and the re-rendered answer are added. Returns the number of turns.
+    if responses:
+        from chatbot_engine import category_labels, default_response, response_renderer
+    exported = 0
+    for session_id, turn in store.iter_turns():
+        record = {"session": session_id, **turn._asdict()}
+        if responses:
+            intent = category_labels.get(turn.intent_id)
+            record["intent"] = intent
+            record["response"] = response_renderer.render(intent, turn.entities, default_response)
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        exported += 1
+    return exported
+
+
+def bench(store, sessions, turns, threads=8):
+    # Append `turns` turns to each of `sessions` sessions from several threads,
+    # reading the recent window back after every turn like the app does
+    from concurrent.futures import ThreadPoolExecutor
+
+    cities = ["<b>London</b>", "<b>Madrid</b>", "<b>Paris</b>", "<b>New York</b>"]
+
+    def run_session(session):
+        session_id = f"bench-{session}"
+        for turn in range(turns):
+            store.append(session_id, f"How do I cancel my ticket {turn}?", turn % 25,
+                         {"{{CITY}}": cities[(session + turn) % len(cities)]})
+            store.recent(session_id, 10)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(run_session, range(sessions)))
+    store.flush()
+    elapsed = time.perf_counter() - started
+    import resource
+    return {
+        "sessions": sessions,
+        "turns": sessions * turns,
+        "turns_per_second": sessions * turns / elapsed,
+        "peak_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or load-test the chat history store")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export")
+    export_parser.add_argument("database", help="SQLite conversation store")
+    export_parser.add_argument("output", help="output .jsonl file ('-' for stdout)")
+    export_parser.add_argument("--responses", action="store_true", help="include the intent name and rendered answer")
+
+    bench_parser = subparsers.add_parser("bench")
+    bench_parser.add_argument("--store", default="memory", help="'memory' or a SQLite database path")
+    bench_parser.add_argument("--sessions", type=int, default=5000)
+    bench_parser.add_argument("--turns", type=int, default=20)
+    bench_parser.add_argument("--threads", type=int, default=8)
+
+    args = parser.parse_args()
+    if args.command == "export":
+        if not os.path.exists(args.database):
+            parser.error(f"{args.database} does not exist")
+        store = SQLiteConversationStore(args.database)
+        out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+        try:
+            exported = export_jsonl(store, out, args.responses)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+            store.close()
+        print(f"Exported {exported} turns", file=sys.stderr)
+    else:
+        store = open_conversation_store(args.store)
+        report = bench(store, args.sessions, args.turns, args.threads)
+        store.close()
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
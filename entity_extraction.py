@@ -0,0 +1,169 @@
+import time
+
+import spacy
+from spacy.matcher import PhraseMatcher
+from spacy.tokens import Span
+from spacy.util import filter_spans
+
+# Tiered extraction of the {{EVENT}} / {{CITY}} placeholders.
+#
+#   1. gazetteer   - PhraseMatcher over known city and event names on a blank
+#                    English tokenizer (no model forward pass at all)
+#   2. small       - en_core_web_sm with everything but the NER pipe disabled
+#   3. transformer - en_core_web_trf, opt-in, only for slots tiers 1-2 left empty
+#
+# A tier only fills the slots the earlier ones left empty, and the later tiers
+# are skipped once both {{EVENT}} and {{CITY}} are filled. Gazetteer matches
+# are rendered with the name's spelling from the lists below ("SXSW", "Rio de
+# Janeiro"); model entities are title-cased. Every call reports
+# which tier produced the answer and how long each took, so the cost of
+# entity extraction is visible per request.
+
+# Cities the gazetteer tier recognises (matched case-insensitively, except
+# for the ambiguous_names below)
+known_cities = [
+    "Amsterdam", "Athens", "Atlanta", "Austin", "Bangalore", "Bangkok", "Barcelona", "Beijing", "Berlin",
+    "Boston", "Brisbane", "Brussels", "Budapest", "Buenos Aires", "Cairo", "Cape Town", "Chennai", "Chicago",
+    "Copenhagen", "Dallas", "Delhi", "Denver", "Dubai", "Dublin", "Edinburgh", "Frankfurt", "Glasgow",
+    "Hamburg", "Helsinki", "Hong Kong", "Houston", "Hyderabad", "Istanbul", "Jakarta", "Johannesburg",
+    "Kolkata", "Kuala Lumpur", "Las Vegas", "Lisbon", "London", "Los Angeles", "Madrid", "Manchester",
+    "Melbourne", "Mexico City", "Miami", "Milan", "Montreal", "Moscow", "Mumbai", "Munich", "Nashville",
+    "New Delhi", "New Orleans", "New York", "New York City", "Oslo", "Paris", "Philadelphia", "Phoenix",
+    "Prague", "Rio de Janeiro", "Rome", "San Diego", "San Francisco", "Santiago", "Sao Paulo", "Seattle",
+    "Seoul", "Shanghai", "Singapore", "Stockholm", "Sydney", "Taipei", "Tokyo", "Toronto", "Vancouver",
+    "Vienna", "Warsaw", "Washington", "Zurich",
+]
+
+# Event names the gazetteer tier recognises (matched case-insensitively, except
+# for the ambiguous_names below)
+known_events = [
+    "Austin City Limits", "Burning Man", "Champions League Final", "Coachella", "Comic-Con", "Download Festival",
+    "Edinburgh Fringe", "Eurovision", "Formula 1 Grand Prix", "Glastonbury", "Grand Prix", "Lollapalooza",
+    "Mardi Gras", "Met Gala", "NBA Finals", "Oktoberfest", "Olympics", "Primavera Sound", "Reading Festival",
+    "Rock in Rio", "SXSW", "Stanley Cup Final", "Super Bowl", "Tomorrowland", "US Open", "Ultra Music Festival",
+    "Wimbledon", "World Cup", "World Series",
+]
+
+# Names that are also ordinary words or people's names in lower case ("help us
+# open a dispute", "reading festival tickets"), matched only with the exact
+# capitalization given here
+ambiguous_names = {
+    "Austin", "Dallas", "Download Festival", "Houston", "Phoenix", "Reading Festival", "Santiago", "US Open",
+    "Washington",
+}
+
+# Slot filled by each entity label, and the text used when none is found
+placeholder_slots = {"EVENT": "{{EVENT}}", "GPE": "{{CITY}}"}
+placeholder_defaults = {"{{EVENT}}": "the event", "{{CITY}}": "the city"}
+
+# Pipes the small model does not need for NER
+unused_small_pipes = ["tok2vec", "tagger", "parser", "attribute_ruler", "lemmatizer", "senter"]
+
+
+# Load a spaCy pipeline, downloading it on first use
+def load_spacy_model(name="en_core_web_trf", disable=()):
+    try:
+        return spacy.load(name, disable=list(disable))
+    except OSError:
+        spacy.cli.download(name)
+        return spacy.load(name, disable=list(disable))
+
+
+# The {{EVENT}}/{{CITY}} values found in an already processed spaCy doc (the
+# first EVENT and the first GPE entity), without defaults. Gazetteer entities
+# carry their canonical name as kb_id; model entities are title-cased.
+def found_placeholders(doc):
+    found = {}
+    for ent in doc.ents:
+        slot = placeholder_slots.get(ent.label_)
+        if slot is not None and slot not in found:
+            found[slot] = f"<b>{ent.kb_id_ or ent.text.title()}</b>"
+    return found
+
+
+# Build the {{EVENT}}/{{CITY}} values from an already processed spaCy doc,
+# using the neutral defaults for whatever wasn't found
+def placeholders_from_doc(doc):
+    return dict(placeholder_defaults, **found_placeholders(doc))
+
+
+class GazetteerTier:
+    # Blank English tokenizer plus two precompiled PhraseMatchers, one
+    # case-insensitive and one exact-case for the ambiguous names, with one
+    # match id per name; labels matches as EVENT/GPE with the name as kb_id so
+    # placeholders_from_doc can consume the doc unchanged
+
+    def __init__(self, cities=known_cities, events=known_events, ambiguous=ambiguous_names):
+        self.nlp = spacy.blank("en")
+        self.matcher = PhraseMatcher(self.nlp.vocab, attr="LOWER")
+        self.exact_matcher = PhraseMatcher(self.nlp.vocab, attr="ORTH")
+        self.labels = {}  # name -> GPE/EVENT
+        for label, names in (("GPE", cities), ("EVENT", events)):
+            for name in names:
+                self.labels[name] = label
+                matcher = self.exact_matcher if name in ambiguous else self.matcher
+                matcher.add(name, [self.nlp.make_doc(name)])
+
+    def _annotate(self, doc):
+        matches = self.matcher(doc) + self.exact_matcher(doc)
+        strings = self.nlp.vocab.strings
+        spans = [Span(doc, start, end, label=self.labels[strings[match_id]], kb_id=match_id)
+                 for match_id, start, end in matches]
+        doc.ents = filter_spans(spans)  # Prefer the longest match ("New York City" over "New York")
+        return doc
+
+    def __call__(self, text):
+        return self._annotate(self.nlp.make_doc(text))
+
+    def pipe(self, texts, batch_size=None, n_process=1):
+        # Tokenizing is cheap enough that n_process is ignored here
+        for doc in self.nlp.tokenizer.pipe(texts, batch_size=batch_size or 1000):
+            yield self._annotate(doc)
+
+
+class TieredEntityExtractor:
+    # Runs the tiers cheapest first, each filling only the slots still empty,
+    # and stops once both slots are filled
+
+    def __init__(self, small_model="en_core_web_sm", transformer_model=None):
+        self.tiers = [("gazetteer", GazetteerTier())]
+        if small_model:
+            self.tiers.append(("small", load_spacy_model(small_model, disable=unused_small_pipes)))
+        if transformer_model:
+            # Opt-in: only consulted for texts the cheaper tiers left a slot empty for
+            self.tiers.append(("transformer", load_spacy_model(transformer_model)))
+
+    def extract(self, text):
+        # Returns (dynamic_placeholders, report) where report names the last
+        # tier that filled a slot and the time spent in every tier that ran
+        results, reports = self.extract_batch([text])
+        return results[0], reports[0]
+
+    def extract_batch(self, texts, batch_size=None, n_process=1):
+        # Same as extract() for a list: every tier streams only the texts the
+        # previous tiers left a slot empty for through nlp.pipe
+        texts = list(texts)
+        found = [{} for _ in texts]
+        reports = [{"tier": "none", "ms": 0.0, "tiers_ms": {}} for _ in texts]
+        pending = list(range(len(texts)))
+        for name, nlp in self.tiers:
+            if not pending:
+                break
+            started = time.perf_counter()
+            if len(pending) == 1:
+                docs = [nlp(texts[pending[0]])]  # Single question: skip the nlp.pipe machinery
+            else:
+                docs = list(nlp.pipe((texts[i] for i in pending), batch_size=batch_size or 64, n_process=n_process))
+            per_text = (time.perf_counter() - started) * 1000 / len(pending)
+            unresolved = []
+            for i, doc in zip(pending, docs):
+                reports[i]["tiers_ms"][name] = per_text
+                reports[i]["ms"] += per_text
+                new = {slot: value for slot, value in found_placeholders(doc).items() if slot not in found[i]}
+                if new:
+                    found[i].update(new)
+                    reports[i]["tier"] = name
+                if len(found[i]) < len(placeholder_slots):
+                    unresolved.append(i)
+            pending = unresolved
+        return [dict(placeholder_defaults, **slots) for slots in found], reports
@@ -0,0 +1,308 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import metrics
+from benchmark import percentile
+from chatbot_engine import ChatbotEngine, capitalize_prompt, default_model_dir, default_torch_threads, example_queries
+from model_artifacts import ensure_model_files
+from model_backends import backend_names
+from worker_pool import WorkerPool
+
+# Local inference service for the chatbot. Concurrent questions are coalesced
+# into micro-batches (bounded by a max batch size and a max wait deadline) and
+# answered with a single padded forward pass, instead of every Streamlit
+# session running its own one-sentence pass under the GIL.
+#
+#   python inference_server.py serve --port 8765
+#   python inference_server.py serve --unix-socket /tmp/chatbot.sock
+#   python inference_server.py serve --workers 4 --threads-per-worker 4
+#   python inference_server.py bench --concurrency 32 --requests 512
+#
+# Requests are plain HTTP: POST /predict with {"query": "..."} returns the
+# intent, confidence, entities and rendered response as JSON. With --metrics,
+# GET /metrics returns stage timings and counters in Prometheus text format.
+#
+# With --workers N the questions are answered by N pinned worker processes
+# instead of the in-process micro-batcher (see worker_pool.py); the stage
+# metrics are then recorded inside the workers and not exposed here.
+
+
+class MicroBatcher:
+    # Collects queries from many coroutines and runs them through the engine
+    # together. A batch is flushed as soon as it holds max_batch_size queries
+    # or max_wait_ms has passed since its first query arrived.
+
+    def __init__(self, engine, max_batch_size=32, max_wait_ms=5.0):
+        self.engine = engine
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.batch_sizes = []
+        self._queue = None
+        self._worker = None
+        # One inference thread: batches run back to back, never concurrently
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        self._executor.shutdown(wait=True)
+
+    async def submit(self, query):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((query, future))
+        return await future
+
+    async def _collect(self):
+        # Block for the first query, then keep taking more until the batch is
+        # full or the deadline passes
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            queries = [query for query, _ in batch]
+            self.batch_sizes.append(len(batch))
+            try:
+                results = await loop.run_in_executor(self._executor, self.engine.respond, queries)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+class PoolRunner:
+    # Hands each query to a started WorkerPool; the workers batch whatever is
+    # queued when they pick up work, so no batching happens here
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        await asyncio.get_running_loop().run_in_executor(None, self.pool.close)
+
+    async def submit(self, query):
+        results = await asyncio.wrap_future(self.pool.submit([query]))
+        return results[0]
+
+
+class SequentialRunner:
+    # The current one-at-a-time path (one forward pass per query), exposed
+    # through the same submit() interface so the load generator can compare
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._lock = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+
+    async def start(self):
+        self._lock = asyncio.Lock()
+
+    async def stop(self):
+        self._executor.shutdown(wait=True)
+
+    async def submit(self, query):
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            results = await loop.run_in_executor(self._executor, self.engine.respond, [query])
+        return results[0]
+
+
+# --- Minimal HTTP/1.1 front end (stdlib only) ---
+
+def _http_response(status, payload, content_type="application/json"):
+    body = payload.encode("utf-8") if isinstance(payload, str) else json.dumps(payload).encode("utf-8")
+    reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}[status]
+    head = (
+        f"HTTP/1.1 {status} {reason}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "\r\n"
+    )
+    return head.encode("latin-1") + body
+
+
+async def _read_request(reader):
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, path, _ = request_line.decode("latin-1").split(" ", 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    body = await reader.readexactly(length) if length else b""
+    return method, path, headers, body
+
+
+def make_handler(batcher):
+    async def handle(reader, writer):
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                if method == "POST" and path == "/predict":
+                    try:
+                        query = json.loads(body or b"{}")["query"]
+                    except (ValueError, KeyError, TypeError):
+                        writer.write(_http_response(400, {"error": "expected JSON body with a 'query' field"}))
+                    else:
+                        try:
+                            result = await batcher.submit(capitalize_prompt(query))
+                            writer.write(_http_response(200, result))
+                        except Exception as e:
+                            writer.write(_http_response(500, {"error": str(e)}))
+                elif method == "GET" and path == "/metrics":
+                    writer.write(_http_response(200, metrics.render(), "text/plain; version=0.0.4"))
+                elif method == "GET" and path == "/health":
+                    writer.write(_http_response(200, {"status": "ok"}))
+                else:
+                    writer.write(_http_response(404, {"error": f"no route for {method} {path}"}))
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+    return handle
+
+
+async def serve(engine, host="127.0.0.1", port=8765, unix_socket=None, max_batch_size=32, max_wait_ms=5.0, pool=None):
+    batcher = PoolRunner(pool) if pool is not None else MicroBatcher(engine, max_batch_size, max_wait_ms)
+    await batcher.start()
+    handler = make_handler(batcher)
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        server = await asyncio.start_unix_server(handler, path=unix_socket)
+        print(f"Serving on unix://{unix_socket}")
+    else:
+        server = await asyncio.start_server(handler, host, port)
+        print(f"Serving on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await batcher.stop()
+
+
+# --- In-process load generator ---
+
+async def run_load(runner, queries, concurrency=32, total_requests=512):
+    # concurrency virtual users fire total_requests queries between them, each
+    # waiting for its answer before sending the next one
+    latencies = []
+    counter = iter(range(total_requests))
+
+    async def user():
+        for i in counter:
+            started = time.perf_counter()
+            await runner.submit(queries[i % len(queries)])
+            latencies.append(time.perf_counter() - started)
+
+    await runner.start()
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+    finally:
+        elapsed = time.perf_counter() - started
+        await runner.stop()
+    return {
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "qps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+    }
+
+
+def benchmark(engine, concurrency=32, total_requests=512, max_batch_size=32, max_wait_ms=5.0):
+    queries = list(example_queries)
+    report = {
+        "sequential": asyncio.run(run_load(SequentialRunner(engine), queries, concurrency, total_requests)),
+    }
+    batcher = MicroBatcher(engine, max_batch_size, max_wait_ms)
+    report["micro_batched"] = asyncio.run(run_load(batcher, queries, concurrency, total_requests))
+    report["micro_batched"]["mean_batch_size"] = statistics.fmean(batcher.batch_sizes) if batcher.batch_sizes else 0.0
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-batching inference server for the ticketing chatbot")
+    parser.add_argument("--model-dir", default=default_model_dir)
+    parser.add_argument("--backend", choices=backend_names, default="torch")
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="run the HTTP / Unix socket endpoint")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument("--unix-socket", default=None)
+    serve_parser.add_argument("--metrics", action="store_true", help="record metrics and expose them on GET /metrics")
+    serve_parser.add_argument("--workers", type=int, default=1, help="worker processes, each with its own model")
+    serve_parser.add_argument("--threads-per-worker", type=int, default=None,
+                              help="torch threads (and pinned cores) per worker; default: cores / workers")
+
+    bench_parser = subparsers.add_parser("bench", help="compare micro-batching with the one-at-a-time path")
+    bench_parser.add_argument("--concurrency", type=int, default=32)
+    bench_parser.add_argument("--requests", type=int, default=512)
+
+    args = parser.parse_args()
+    model_dir = ensure_model_files(args.model_dir)
+    if args.command == "serve" and args.workers > 1:
+        engine_options = {"model_dir": model_dir, "backend": args.backend}
+        pool = WorkerPool(engine_options, args.workers, args.threads_per_worker, args.max_batch_size).start()
+        asyncio.run(serve(None, args.host, args.port, args.unix_socket, pool=pool))
+        return
+    engine = ChatbotEngine(model_dir, backend=args.backend, torch_threads=default_torch_threads())
+    if args.command == "serve":
+        if args.metrics:
+            metrics.enable()
+        asyncio.run(serve(engine, args.host, args.port, args.unix_socket, args.max_batch_size, args.max_wait_ms))
+    else:
+        report = benchmark(engine, args.concurrency, args.requests, args.max_batch_size, args.max_wait_ms)
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
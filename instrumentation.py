@@ -0,0 +1,163 @@
+import bisect
+import threading
+import time
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Pluggable instrumentation for the inference path.
+#
+#   with metrics.span("forward"):      times a stage into chatbot_stage_seconds
+#   metrics.inc("chatbot_intent_total", {"intent": "buy_ticket"})
+#   metrics.observe("chatbot_token_length", 17)
+#
+# Extra span hooks (e.g. to forward spans to a tracer) are registered with
+# metrics.add_hook(hook) and called as hook(name, seconds). Everything is a
+# no-op until metrics.enable() is called: span() then hands back one shared
+# nullcontext and inc()/observe() return after a single attribute check.
+# start_metrics_server() exposes the Prometheus text format on /metrics.
+
+# Upper bounds of the histogram buckets, per histogram
+histogram_buckets = {
+    "chatbot_stage_seconds": (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+    "chatbot_request_seconds": (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+    "chatbot_first_chunk_seconds": (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+    "chatbot_token_length": (8, 16, 24, 32, 48, 64, 128, 256, 512),
+    "chatbot_batch_size": (1, 2, 4, 8, 16, 32, 64, 128),
+}
+
+metric_help = {
+    "chatbot_stage_seconds": "Time spent in each stage of the inference path",
+    "chatbot_request_seconds": "End-to-end time to answer one chat message",
+    "chatbot_first_chunk_seconds": "Time until the first part of a reply is shown",
+    "chatbot_token_length": "Tokens per question after truncation",
+    "chatbot_batch_size": "Questions per classifier forward pass",
+    "chatbot_tokens_total": "Tokens in classifier batches, real or padding",
+    "chatbot_intent_total": "Predicted intents",
+    "chatbot_cache_total": "Answer lookups by where the answer came from",
+}
+
+_null_span = nullcontext()
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class _Span:
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.started
+        self.metrics.observe("chatbot_stage_seconds", seconds, {"stage": self.name})
+        for hook in self.metrics.hooks:
+            hook(self.name, seconds)
+
+
+class Metrics:
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.hooks = []
+        self._counters = {}    # name -> {label key -> value}
+        self._histograms = {}  # name -> {label key -> [bucket counts..., sum, count]}
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def span(self, name):
+        if not self.enabled:
+            return _null_span
+        return _Span(self, name)
+
+    def inc(self, name, labels=None, amount=1):
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name, value, labels=None):
+        if not self.enabled:
+            return
+        buckets = histogram_buckets[name]
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            state = series.get(key)
+            if state is None:
+                # One slot per bucket, one for +Inf, then sum and count
+                state = series[key] = [0] * (len(buckets) + 3)
+            state[bisect.bisect_left(buckets, value)] += 1  # Index len(buckets) is +Inf
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self):
+        # Prometheus text exposition format
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# HELP {name} {metric_help.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+            for name, series in sorted(self._histograms.items()):
+                buckets = histogram_buckets[name]
+                lines.append(f"# HELP {name} {metric_help.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, state in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(list(buckets) + ["+Inf"], state[:-2]):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {state[-2]}")
+                    lines.append(f"{name}_count{_format_labels(key)} {state[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry used by the engine, the app and the server
+metrics = Metrics()
+
+
+def start_metrics_server(port=9100, host="127.0.0.1", registry=metrics):
+    # Serve GET /metrics from a daemon thread; returns the server
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    registry.enable()
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
@@ -0,0 +1,180 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; locking is skipped there
+    fcntl = None
+
+# Makes sure the fine-tuned ALBERT files are present and intact before the
+# model is loaded.
+#
+#   * the bundled ALBERT_Model/ directory is used as-is when every file in it
+#     matches the manifest, otherwise valid bundled files are copied over
+#   * missing or corrupt files are streamed from GitHub in chunks, all files
+#     concurrently, into temp files that are verified (size + sha256) before
+#     being atomically renamed into place
+#   * an exclusive file lock on the target directory lets many worker
+#     processes start at once: one fetches, the rest wait and then verify
+#
+# repo_url can point at any HTTP server (e.g. `python -m http.server` over a
+# copy of the files), which makes the whole flow testable offline.
+
+repo_url = 'https://github.com/MarpakaPradeepSai/Simple-Events-Ticketing-Customer-Support-Chatbot/raw/main/ALBERT_Model'
+
+# Directory Simple_Chatbot.py keeps the fine-tuned model files in
+default_model_dir = "./albert_model"
+
+bundled_model_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ALBERT_Model")
+
+# Expected size in bytes and sha256 of every model file
+model_manifest = {
+    "config.json": (1946, "a01a56493c91a13b950423056329a4fea664bc160f48540d1fe7d4470687e8fc"),
+    "model.safetensors": (46814660, "9fef9d5ac6e367f6cad554488d8e4f116cf5e5753ed2a89d9c80265bdc08104b"),
+    "special_tokens_map.json": (286, "d40a278cf247077b88d92f7657c43f95de0b3ce2839c0303d3eb04786244ca1c"),
+    "spiece.model": (760289, "fefb02b667a6c5c2fe27602d28e5fb3428f66ab89c7d6f388e7c8d44a02d0336"),
+    "tokenizer_config.json": (1277, "6d312268feb2b4d1c1b1c44c8a1ff3a25d31795aa41c6da9b766657e308a4175"),
+}
+
+chunk_size = 1 << 20  # 1 MiB
+
+
+class ArtifactError(Exception):
+    pass
+
+
+# True when path exists with the expected size and sha256
+def verify_file(path, expected):
+    size, sha256 = expected
+    try:
+        if os.path.getsize(path) != size:
+            return False
+    except OSError:
+        return False
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest() == sha256
+
+
+# True when target is missing or older than any of the files it is built from
+def is_stale(target, sources):
+    try:
+        built = os.path.getmtime(target)
+    except OSError:
+        return True
+    return any(os.path.exists(source) and os.path.getmtime(source) > built for source in sources)
+
+
+class DirectoryLock:
+    # Exclusive advisory lock held while a directory is being filled in
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, ".lock")
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, "a")
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+
+
+def _install(target, expected, fill):
+    # Write into a temp file next to target via fill(f), verify, then rename
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(target) + ".", suffix=".part", dir=os.path.dirname(target))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            fill(f)
+        if not verify_file(tmp_path, expected):
+            raise ArtifactError(f"{os.path.basename(target)} failed size/sha256 verification")
+        os.replace(tmp_path, target)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def download_file(url, target, expected, timeout=60):
+    def fill(f):
+        with requests.get(url, stream=True, timeout=timeout) as response:
+            if response.status_code != 200:
+                raise ArtifactError(f"Failed to download {url}. Status code: {response.status_code}")
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+    _install(target, expected, fill)
+
+
+def copy_file(source, target, expected):
+    def fill(f):
+        with open(source, "rb") as src:
+            shutil.copyfileobj(src, f, chunk_size)
+    _install(target, expected, fill)
+
+
+def _fetch(name, model_dir, bundled_dir, base_url, expected):
+    started = time.perf_counter()
+    target = os.path.join(model_dir, name)
+    if verify_file(target, expected):
+        source = "cached"
+    elif bundled_dir and verify_file(os.path.join(bundled_dir, name), expected):
+        copy_file(os.path.join(bundled_dir, name), target, expected)
+        source = "bundled"
+    else:
+        download_file(f"{base_url}/{name}", target, expected)
+        source = "downloaded"
+    return name, {"source": source, "seconds": time.perf_counter() - started}
+
+
+def ensure_model_files(model_dir, bundled_dir=bundled_model_dir, base_url=repo_url, manifest=model_manifest,
+                       max_workers=None, report=None):
+    # Returns the directory to load the model from. report, if given, is
+    # filled with where each file came from and how long it took.
+    if report is None:
+        report = {}
+    if bundled_dir and all(verify_file(os.path.join(bundled_dir, name), expected) for name, expected in manifest.items()):
+        report.update({name: {"source": "bundled", "seconds": 0.0} for name in manifest})
+        return bundled_dir
+
+    os.makedirs(model_dir, exist_ok=True)
+    with DirectoryLock(model_dir):
+        with ThreadPoolExecutor(max_workers=max_workers or len(manifest)) as pool:
+            futures = [
+                pool.submit(_fetch, name, model_dir, bundled_dir, base_url, expected)
+                for name, expected in manifest.items()
+            ]
+            for future in futures:
+                name, entry = future.result()
+                report[name] = entry
+    return model_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch and verify the fine-tuned ALBERT model files")
+    parser.add_argument("--model-dir", default=default_model_dir)
+    parser.add_argument("--repo-url", default=repo_url)
+    parser.add_argument("--no-bundled", action="store_true", help="ignore the bundled ALBERT_Model directory")
+    args = parser.parse_args()
+
+    report = {}
+    started = time.perf_counter()
+    directory = ensure_model_files(args.model_dir, None if args.no_bundled else bundled_model_dir, args.repo_url, report=report)
+    print(json.dumps({"model_dir": directory, "seconds": time.perf_counter() - started, "files": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
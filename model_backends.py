@@ -0,0 +1,181 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+import torch
+from transformers import AutoModelForSequenceClassification
+
+from model_artifacts import is_stale
+from shared_weights import load_mmap_model
+from tokenization import cache_digest, default_cache_dir, load_tokenizer
+
+# Interchangeable CPU backends for the ALBERT intent classifier. Every backend
+# is called with a padded tokenizer batch and returns the logits as a CPU
+# float tensor, so the engine doesn't care which one it runs.
+#
+#   torch       - fp32 eager PyTorch (the reference)
+#   torch-int8  - torch dynamic int8 quantization of the Linear layers
+#   onnx        - exported ONNX graph run under onnxruntime with all graph
+#                 optimizations enabled (onnxruntime is an optional
+#                 dependency, see requirements.txt). The graph is exported
+#                 on first use into the tokenizer's cache directory, named
+#                 after a digest of the weights, config and torch version, so
+#                 changed weights get a fresh export and the (possibly
+#                 read-only) model directory is never written to. An explicit
+#                 onnx_path is re-exported whenever the weights or config are
+#                 newer than it.
+#
+# Run this module to check that a backend predicts the same intents as the
+# fp32 model:  python model_backends.py --backend onnx
+
+backend_names = ["torch", "torch-int8", "onnx"]
+
+# Tensors the ONNX graph takes, in the order they are exported
+onnx_inputs = ["input_ids", "attention_mask", "token_type_ids"]
+
+# Files the ONNX graph is exported from
+onnx_sources = ["model.safetensors", "config.json"]
+
+
+class TorchBackend:
+
+    def __init__(self, model, device="cpu"):
+        self.device = torch.device(device)
+        self.model = model
+        self.model.eval()  # Set to evaluation mode
+        self.model.to(self.device)
+
+    def __call__(self, batch):
+        batch = {name: tensor.to(self.device) for name, tensor in batch.items()}
+        with torch.no_grad():
+            return self.model(**batch).logits.cpu()
+
+
+class QuantizedTorchBackend(TorchBackend):
+
+    def __init__(self, model):
+        model.eval()
+        quantized = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        super().__init__(quantized, "cpu")
+
+
+class OnnxBackend:
+
+    def __init__(self, model, onnx_path, num_threads=None, sources=()):
+        # sources: files the export is built from; re-exported when newer
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("the onnx backend needs onnxruntime: pip install onnxruntime") from e
+
+        if is_stale(onnx_path, sources):
+            export_onnx(model, onnx_path)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = num_threads or torch.get_num_threads()
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {node.name for node in self.session.get_inputs()}
+
+    def __call__(self, batch):
+        feeds = {name: tensor.cpu().numpy() for name, tensor in batch.items() if name in self.input_names}
+        logits = self.session.run(["logits"], feeds)[0]
+        return torch.from_numpy(logits)
+
+
+# Export the classifier to ONNX with dynamic batch and sequence axes
+def export_onnx(model, onnx_path):
+    model.eval()
+    dummy = {
+        "input_ids": torch.ones(1, 8, dtype=torch.long),
+        "attention_mask": torch.ones(1, 8, dtype=torch.long),
+        "token_type_ids": torch.zeros(1, 8, dtype=torch.long),
+    }
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in onnx_inputs}
+    dynamic_axes["logits"] = {0: "batch"}
+    # Export into a temp directory of its own next to the target, so
+    # processes exporting at once don't clobber each other, then rename the
+    # files into place, the graph last (newer exporters write the weights to
+    # a "<name>.data" file next to it, referenced by that name)
+    directory = os.path.dirname(os.path.abspath(onnx_path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".onnx-export-", dir=directory)
+    name = os.path.basename(onnx_path)
+    try:
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                (dummy["input_ids"], dummy["attention_mask"], dummy["token_type_ids"]),
+                os.path.join(tmp_dir, name),
+                input_names=onnx_inputs,
+                output_names=["logits"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14,
+            )
+        for produced in sorted(os.listdir(tmp_dir), key=lambda produced: produced == name):
+            os.replace(os.path.join(tmp_dir, produced), os.path.join(directory, produced))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+# Load the fine-tuned model behind the requested backend, plus its tokenizer.
+# With mmap_weights the weights are memory-mapped and shared between worker
+# processes (see shared_weights.py) instead of copied into each one.
+def load_model_and_tokenizer(model_dir, backend="torch", device="cpu", onnx_path=None, mmap_weights=False,
+                             cache_dir=default_cache_dir):
+    if backend not in backend_names:
+        raise ValueError(f"Unknown model backend {backend!r}; expected one of {', '.join(backend_names)}")
+    if mmap_weights:
+        model = load_mmap_model(model_dir)
+    else:
+        model = AutoModelForSequenceClassification.from_pretrained(model_dir)
+    tokenizer = load_tokenizer(model_dir, cache_dir)
+    if backend == "torch":
+        return TorchBackend(model, device), tokenizer
+    if backend == "torch-int8":
+        return QuantizedTorchBackend(model), tokenizer
+    if onnx_path is None:
+        digest = cache_digest(model_dir, onnx_sources, torch.__version__)
+        return OnnxBackend(model, os.path.join(cache_dir, f"model-{digest}.onnx")), tokenizer
+    sources = [os.path.join(model_dir, name) for name in onnx_sources]
+    return OnnxBackend(model, onnx_path, sources=sources), tokenizer
+
+
+# Compare a backend's argmax intents against the fp32 model on a fixed query set
+def check_parity(model_dir, backend, queries):
+    from chatbot_engine import category_labels
+
+    reference, tokenizer = load_model_and_tokenizer(model_dir, "torch")
+    candidate, _ = load_model_and_tokenizer(model_dir, backend)
+    batch = tokenizer(list(queries), padding=True, truncation=True, return_tensors="pt")
+    expected = torch.argmax(reference(batch), dim=-1).tolist()
+    actual = torch.argmax(candidate(batch), dim=-1).tolist()
+    mismatches = [
+        (query, category_labels[e], category_labels[a])
+        for query, e, a in zip(queries, expected, actual)
+        if e != a
+    ]
+    return mismatches
+
+
+def main():
+    from chatbot_engine import default_model_dir, example_queries
+
+    parser = argparse.ArgumentParser(description="Check a model backend against the fp32 PyTorch model")
+    parser.add_argument("--model-dir", default=default_model_dir)
+    parser.add_argument("--backend", choices=backend_names, default="onnx")
+    args = parser.parse_args()
+
+    mismatches = check_parity(args.model_dir, args.backend, example_queries)
+    for query, expected, actual in mismatches:
+        print(f"MISMATCH {query!r}: fp32={expected} {args.backend}={actual}")
+    if mismatches:
+        print(f"{args.backend}: {len(mismatches)}/{len(example_queries)} intents differ from the fp32 model", file=sys.stderr)
+        return 1
+    print(f"{args.backend}: all {len(example_queries)} intents match the fp32 model")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
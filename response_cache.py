@@ -0,0 +1,75 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Process-wide cache of chatbot answers, shared by every Streamlit session.
+# Keys are the normalized question text; values hold everything needed to
+# re-render the reply (intent, confidence, logits and extracted entities), so
+# a hit skips both the NER and the ALBERT forward pass. Entries are evicted
+# least-recently-used once max_size is reached, and expire after ttl_seconds.
+
+punctuation_pattern = re.compile(r"[^\w\s]")
+whitespace_pattern = re.compile(r"\s+")
+
+
+# Fold case, punctuation and whitespace so trivially different spellings of
+# the same question share one cache entry
+def normalize_query(text):
+    text = punctuation_pattern.sub(" ", text.casefold())
+    return whitespace_pattern.sub(" ", text).strip()
+
+
+class ResponseCache:
+
+    def __init__(self, max_size=1024, ttl_seconds=3600.0, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, text):
+        key = normalize_query(text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self.clock():
+                del self._entries[key]
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, text, value):
+        key = normalize_query(text)
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,106 @@
+import re
+import timeit
+
+# Precompiled response templates. Static placeholders never change, so each
+# template is rendered once at startup with them already substituted, and the
+# remaining {{EVENT}}/{{CITY}} slots are split out into a segment list that is
+# joined in a single pass per reply (instead of ~80 str.replace scans).
+#
+# Run this module for a microbenchmark against replace_placeholders().
+
+placeholder_pattern = re.compile(r"\{\{[^{}]*\}\}")
+
+# Values used when the entity extractor didn't provide a slot
+default_dynamic_placeholders = {
+    "{{EVENT}}": "the event",
+    "{{CITY}}": "the city",
+}
+
+
+class ResponseRenderer:
+
+    def __init__(self, templates, static_placeholders, dynamic_defaults=default_dynamic_placeholders):
+        self.dynamic_defaults = dict(dynamic_defaults)
+        # intent -> (literals, slots) with len(literals) == len(slots) + 1
+        self.compiled = {}
+        for intent, template in templates.items():
+            self.compiled[intent] = self._compile(intent, template, static_placeholders)
+
+    def _compile(self, intent, template, static_placeholders):
+        literals = [""]
+        slots = []
+        position = 0
+        for match in placeholder_pattern.finditer(template):
+            literals[-1] += template[position:match.start()]
+            name = match.group(0)
+            if name in static_placeholders:
+                literals[-1] += static_placeholders[name]
+            elif name in self.dynamic_defaults:
+                slots.append(name)
+                literals.append("")
+            else:
+                # Fail at startup rather than showing raw {{...}} to a user
+                raise ValueError(f"Template for intent {intent!r} uses unknown placeholder {name}")
+            position = match.end()
+        literals[-1] += template[position:]
+        return literals, slots
+
+    def render(self, intent, dynamic_placeholders, default=None):
+        compiled = self.compiled.get(intent)
+        if compiled is None:
+            return default
+        literals, slots = compiled
+        if not slots:
+            return literals[0]
+        return literals[0] + self._fill(literals, slots, dynamic_placeholders)
+
+    def _fill(self, literals, slots, dynamic_placeholders):
+        # Everything after the first literal, with the slots filled in
+        parts = []
+        for slot, literal in zip(slots, literals[1:]):
+            parts.append(dynamic_placeholders.get(slot) or self.dynamic_defaults[slot])
+            parts.append(literal)
+        return "".join(parts)
+
+    def iter_render(self, intent, get_placeholders, default=None):
+        # Yield the text before the first {{EVENT}}/{{CITY}} slot straight
+        # away, and only then call get_placeholders() (which may block on
+        # entity extraction) for the rest
+        compiled = self.compiled.get(intent)
+        if compiled is None:
+            yield default
+            return
+        literals, slots = compiled
+        yield literals[0]
+        if slots:
+            yield self._fill(literals, slots, get_placeholders())
+
+
+def benchmark(number=20000):
+    from chatbot_engine import replace_placeholders, responses, static_placeholders
+
+    renderer = ResponseRenderer(responses, static_placeholders)
+    dynamic_placeholders = {"{{EVENT}}": "<b>Coachella</b>", "{{CITY}}": "<b>London</b>"}
+    for intent, template in responses.items():
+        expected = replace_placeholders(template, dynamic_placeholders, static_placeholders)
+        assert renderer.render(intent, dynamic_placeholders) == expected, intent
+
+    intents = list(responses)
+
+    def run_replace():
+        for intent in intents:
+            replace_placeholders(responses[intent], dynamic_placeholders, static_placeholders)
+
+    def run_compiled():
+        for intent in intents:
+            renderer.render(intent, dynamic_placeholders)
+
+    renders = number * len(intents)
+    replace_us = min(timeit.repeat(run_replace, number=number, repeat=3)) / renders * 1e6
+    compiled_us = min(timeit.repeat(run_compiled, number=number, repeat=3)) / renders * 1e6
+    print(f"replace_placeholders: {replace_us:.2f} us/reply")
+    print(f"ResponseRenderer:     {compiled_us:.2f} us/reply ({replace_us / compiled_us:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    benchmark()
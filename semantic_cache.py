@@ -0,0 +1,252 @@
+import argparse
+import json
+import sys
+import threading
+
+import numpy as np
+import torch
+from transformers import AlbertForSequenceClassification, AlbertModel
+
+# Second-tier answer cache for paraphrases ("how can i buy tickets" vs "How do
+# I buy a ticket?") that the exact-text ResponseCache misses.
+#
+# Questions are embedded with the first few passes of the fine-tuned ALBERT
+# encoder. ALBERT shares one layer's weights across all 12 passes, so a
+# shallow encoder reuses the classifier's own embeddings and layer group
+# without copying them, and costs a fraction of the full forward pass. The
+# embeddings are mean-pooled, L2-normalized and kept in a float16 matrix;
+# lookup is a flat dot product (cosine similarity) against every row. A query
+# whose best match clears `threshold` reuses that match's intent, skipping
+# the remaining encoder passes and the classifier head.
+#
+# The threshold has to be calibrated for the encoder: paraphrases with
+# different intents ("How do I buy a ticket?" / "How do I sell a ticket?")
+# can embed very close together.
+#
+#   python semantic_cache.py calibrate --data bitext.csv --target-precision 0.99
+#
+# embeds the questions, looks half of them up against the other half and
+# reports the lowest similarity at which a reused intent agrees with what
+# ALBERT predicts for the question itself at least --target-precision of the
+# time (the same rule as the cascade classifier's threshold), plus the
+# closest pairs that disagree. Use it as CHATBOT_SEMANTIC_CACHE_THRESHOLD.
+
+
+class ShallowAlbertEncoder:
+
+    def __init__(self, model, num_layers=3):
+        # model is the AlbertForSequenceClassification used for classification,
+        # or the directory to load it from (e.g. when serving through ONNX)
+        if isinstance(model, str):
+            model = AlbertForSequenceClassification.from_pretrained(model)
+        config = model.config.__class__.from_dict(model.config.to_dict())
+        config.num_hidden_layers = num_layers
+        self.encoder = AlbertModel(config, add_pooling_layer=False)
+        # Share the fine-tuned weights instead of the random ones just built
+        self.encoder.embeddings = model.albert.embeddings
+        self.encoder.encoder.embedding_hidden_mapping_in = model.albert.encoder.embedding_hidden_mapping_in
+        self.encoder.encoder.albert_layer_groups = model.albert.encoder.albert_layer_groups
+        self.encoder.eval()
+
+    def embed(self, batch):
+        # Mean-pool the last hidden state over real (non-padding) tokens
+        with torch.no_grad():
+            hidden = self.encoder(**batch).last_hidden_state
+        mask = batch["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+        pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+        return torch.nn.functional.normalize(pooled, dim=-1).numpy()
+
+
+class FlatIndex:
+    # Brute-force inner-product index over a preallocated float16 matrix,
+    # sized on the first set() so the dimension follows the encoder.
+    # search() is the only method an IVF/HNSW replacement needs to match.
+
+    def __init__(self, capacity, dim=None):
+        self.capacity = capacity
+        self.vectors = None if dim is None else np.zeros((capacity, dim), dtype=np.float16)
+        self.size = 0
+
+    def search(self, queries):
+        # Best row and its similarity for every query row
+        if self.size == 0:
+            return np.full(len(queries), -1), np.full(len(queries), -1.0, dtype=np.float32)
+        scores = queries.astype(np.float32) @ self.vectors[:self.size].astype(np.float32).T
+        best = scores.argmax(axis=1)
+        return best, scores[np.arange(len(queries)), best]
+
+    def set(self, row, vector):
+        if self.vectors is None:
+            self.vectors = np.zeros((self.capacity, len(vector)), dtype=np.float16)
+        self.vectors[row] = vector
+        self.size = max(self.size, row + 1)
+
+
+class SemanticCache:
+    # threshold is a cosine similarity and has no default: it depends on the
+    # encoder, so pick one with `python semantic_cache.py calibrate`. dim
+    # defaults to the length of the first embedding added.
+
+    def __init__(self, threshold, capacity=10000, dim=None):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.index = FlatIndex(capacity, dim)
+        self.values = [None] * capacity
+        self.last_used = np.zeros(capacity, dtype=np.int64)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._tick = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, embeddings):
+        # Cached value for each embedding row, or None below the threshold
+        with self._lock:
+            rows, scores = self.index.search(embeddings)
+            results = []
+            for row, score in zip(rows, scores):
+                if row >= 0 and score >= self.threshold:
+                    self._tick += 1
+                    self.last_used[row] = self._tick
+                    self.hits += 1
+                    results.append(self.values[row])
+                else:
+                    self.misses += 1
+                    results.append(None)
+            return results
+
+    def add(self, embedding, value):
+        with self._lock:
+            if self.index.size < self.capacity:
+                row = self.index.size
+            else:
+                # Full: overwrite the least recently used entry
+                row = int(self.last_used.argmin())
+                self.evictions += 1
+            self._tick += 1
+            self.index.set(row, embedding)
+            self.values[row] = value
+            self.last_used[row] = self._tick
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": self.index.size,
+            "capacity": self.capacity,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+# For every probe row, the similarity of its closest seen row with the same
+# label and of its closest seen row with another label (-inf when there is
+# none), plus the overall nearest seen row; in chunks so the score matrix
+# stays small
+def neighbour_similarities(probes, probe_labels, seen, seen_labels, chunk_size=1024):
+    same = np.empty(len(probes), dtype=np.float32)
+    other = np.empty(len(probes), dtype=np.float32)
+    nearest = np.empty(len(probes), dtype=np.int64)
+    for start in range(0, len(probes), chunk_size):
+        rows = slice(start, start + chunk_size)
+        scores = probes[rows] @ seen.T
+        matching = probe_labels[rows, None] == seen_labels[None, :]
+        same[rows] = np.where(matching, scores, -np.inf).max(axis=1)
+        other[rows] = np.where(matching, -np.inf, scores).max(axis=1)
+        nearest[rows] = scores.argmax(axis=1)
+    return same, other, nearest
+
+
+def calibrate(texts, embeddings, intents, target_precision=0.99, threshold=None, seed=42, examples=5):
+    # Cache a random half of the questions and look the other half up.
+    # Which questions are cached when a lookup arrives is up to the traffic,
+    # so every lookup is scored twice, as if the cache held only its closest
+    # question with the same ALBERT intent (a correct reuse) or only its
+    # closest with another intent (a wrong one). The threshold is the lowest
+    # similarity at which those reuses reach target_precision. Lookups whose
+    # normalized text is already cached are left out: the exact-text cache
+    # answers those.
+    from cascade_classifier import calibrate_threshold
+    from response_cache import normalize_query
+
+    intents = np.asarray(intents)
+    order = np.random.default_rng(seed).permutation(len(texts))
+    seen, probes = order[:len(order) // 2], order[len(order) // 2:]
+    seen_texts = {normalize_query(texts[i]) for i in seen}
+    probes = np.array([i for i in probes if normalize_query(texts[i]) not in seen_texts], dtype=np.int64)
+    if len(seen) == 0 or len(probes) == 0:
+        raise ValueError("need at least two distinct questions to calibrate")
+    same, other, nearest = neighbour_similarities(
+        embeddings[probes].astype(np.float32), intents[probes], embeddings[seen].astype(np.float32), intents[seen])
+    similarity = np.concatenate([same, other])
+    correct = np.concatenate([np.ones(len(same)), np.zeros(len(other))])
+    found = np.isfinite(similarity)
+    similarity, correct = similarity[found], correct[found]
+    calibrated = calibrate_threshold(similarity, correct, target_precision)
+
+    # With every seen question cached, a lookup reuses its overall nearest one
+    nearest_similarity = np.maximum(same, other)
+    nearest_correct = intents[seen[nearest]] == intents[probes]
+
+    def at(value):
+        accepted = similarity >= value
+        hits = nearest_similarity >= value
+        return {
+            "threshold": float(value),
+            "precision": float(correct[accepted].mean()) if accepted.any() else None,
+            "full_cache_hit_rate": float(hits.mean()),
+            "full_cache_precision": float(nearest_correct[hits].mean()) if hits.any() else None,
+        }
+
+    closest = np.argsort(-other)[:examples]
+    report = {
+        "questions": len(texts),
+        "lookups": len(probes),
+        "target_precision": target_precision,
+        "calibrated": at(calibrated),
+        "closest_disagreements": [],
+    }
+    for k in closest:
+        if not np.isfinite(other[k]):
+            break
+        scores = np.where(intents[seen] == intents[probes[k]], -np.inf, embeddings[seen] @ embeddings[probes[k]])
+        neighbour = seen[int(scores.argmax())]
+        report["closest_disagreements"].append({
+            "question": texts[probes[k]], "cached": texts[neighbour], "similarity": float(other[k]),
+            "intent": int(intents[probes[k]]), "cached_intent": int(intents[neighbour]),
+        })
+    if threshold is not None:
+        report["requested"] = at(threshold)
+    return report
+
+
+def main():
+    from chatbot_engine import ChatbotEngine, capitalize_prompt, example_queries
+    from model_artifacts import default_model_dir, ensure_model_files
+
+    parser = argparse.ArgumentParser(description="Calibrate the semantic cache similarity threshold against ALBERT")
+    parser.add_argument("command", choices=["calibrate"])
+    parser.add_argument("--data", help="Bitext CSV to calibrate on (default: benchmark corpus)")
+    parser.add_argument("--limit", type=int, default=4000)
+    parser.add_argument("--target-precision", type=float, default=0.99)
+    parser.add_argument("--threshold", type=float, help="also report hit rate and precision at this threshold")
+    parser.add_argument("--model-dir", default=default_model_dir)
+    args = parser.parse_args()
+
+    if args.data:
+        from cascade_classifier import load_training_data
+        texts = load_training_data(args.data)[0][:args.limit]
+    else:
+        from benchmark import synthetic_corpus
+        texts = [capitalize_prompt(query) for query in example_queries] + synthetic_corpus(args.limit)
+    engine = ChatbotEngine(ensure_model_files(args.model_dir), parallel=False)
+    embeddings = engine.embed(texts)
+    intents = [result["intent_id"] for result in engine.classify(texts)]
+    json.dump(calibrate(texts, embeddings, intents, args.target_precision, args.threshold), sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+
+import torch
+from safetensors import safe_open
+from transformers import AutoConfig, AutoModelForSequenceClassification
+
+from model_artifacts import default_model_dir, ensure_model_files
+
+# Memory-mapped ALBERT weights shared by every worker process on a host.
+#
+# model.safetensors is already an mmap-able file: safe_open() maps it and
+# get_tensor() returns CPU tensors that point into that mapping. Every worker
+# assigns those tensors straight into the model, so parameters are backed by
+# the page cache instead of private heap copies: N workers share one physical
+# copy of the weights as long as nobody writes to them, which inference never
+# does. Nothing is written next to the model files, so a read-only bundled
+# model directory works too.
+#
+#   python shared_weights.py --workers 1 4 8
+#
+# compares per-process RSS/PSS and startup time of private vs mmap loading.
+
+weights_name = "model.safetensors"
+
+
+# Build the classifier with its parameters pointing into the mapped file
+def load_mmap_model(model_dir, weights_path=None):
+    weights_path = weights_path or os.path.join(model_dir, weights_name)
+    config = AutoConfig.from_pretrained(model_dir)
+    model = AutoModelForSequenceClassification.from_config(config)
+    with safe_open(weights_path, framework="pt", device="cpu") as weights:
+        state_dict = {name: weights.get_tensor(name) for name in weights.keys()}
+    model.load_state_dict(state_dict, assign=True)
+    model.eval()
+    return model
+
+
+# Resident and proportional set size of this process in MiB (Linux)
+def memory_usage():
+    usage = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in ("Rss", "Pss"):
+                    usage[name.lower() + "_mib"] = int(value.split()[0]) / 1024
+    except OSError:
+        import resource
+        usage["rss_mib"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return usage
+
+
+def _worker(mode, model_dir, barrier, results):
+    started = time.perf_counter()
+    if mode == "mmap":
+        model = load_mmap_model(model_dir)
+    else:
+        model = AutoModelForSequenceClassification.from_pretrained(model_dir).eval()
+    with torch.no_grad():
+        model(input_ids=torch.tensor([[2, 13, 3]]))
+    startup = time.perf_counter() - started
+    # Measure only once every worker is up, so shared pages are counted
+    # against all of them
+    barrier.wait()
+    results.put(dict(memory_usage(), startup_seconds=startup))
+    barrier.wait()
+
+
+def run_workers(mode, model_dir, workers):
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=_worker, args=(mode, model_dir, barrier, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    samples = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    summary = {"mode": mode, "workers": workers}
+    for name in samples[0]:
+        values = [sample[name] for sample in samples]
+        summary[f"mean_{name}"] = sum(values) / len(values)
+        summary[f"total_{name}"] = sum(values)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark private vs memory-mapped ALBERT weights across worker processes")
+    parser.add_argument("--model-dir", default=default_model_dir)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+
+    model_dir = ensure_model_files(args.model_dir)
+    report = []
+    for workers in args.workers:
+        for mode in ("private", "mmap"):
+            report.append(run_workers(mode, model_dir, workers))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
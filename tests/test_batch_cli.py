@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+import batch_cli
+
+
+def write(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_read_queries_shards_and_reports_bad_lines(tmp_path):
+    path = write(tmp_path / "in.jsonl", '{"query": "a"}\n{"q": "b"}\nnot json\n\n{"query": "c"}\n[1]\n')
+    assert list(batch_cli.read_queries(path)) == [(0, "a"), (1, None), (2, None), (4, "c"), (5, None)]
+    assert list(batch_cli.read_queries(path, shard=0, num_shards=2)) == [(0, "a"), (2, None), (4, "c")]
+    assert list(batch_cli.read_queries(path, shard=1, num_shards=2)) == [(1, None), (5, None)]
+
+
+def test_read_queries_csv_missing_field(tmp_path):
+    path = write(tmp_path / "in.csv", "id,question\n1,Can I sell my ticket?\n2\n3,\n")
+    assert list(batch_cli.read_queries(path, "question")) == [(0, "Can I sell my ticket?"), (1, None), (2, "")]
+
+
+class FakeEngine:
+    # Answers with the question's length; enough to check order and skipping
+
+    def __init__(self, **options):
+        self.padding_stats = self
+
+    def respond(self, texts, batch_size=None):
+        return [{"intent": "buy_ticket", "confidence": 1.0, "entities": {}, "response": str(len(text))}
+                for text in texts]
+
+    def stats(self):
+        return {"tokens": 0, "padded_tokens": 0}
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_run_keeps_input_order(tmp_path, monkeypatch, workers):
+    chatbot_engine = pytest.importorskip("chatbot_engine")
+    monkeypatch.setattr(chatbot_engine, "ChatbotEngine", FakeEngine)
+    lines = [json.dumps({"query": "x" * (i + 1)}) if i % 4 else "{}" for i in range(20)]
+    path = write(tmp_path / "in.jsonl", "\n".join(lines) + "\n")
+    output = str(tmp_path / "out.jsonl")
+    totals = batch_cli.run(path, output, batch_size=2, workers=workers, sort_window=2)
+    assert totals["answered"] == 15 and totals["skipped"] == 5
+    with open(output, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert [record["line"] for record in records] == list(range(20))
+    assert [record.get("response") for record in records[:3]] == [None, "2", "3"]
+    assert "error" in records[0]
+
+
+def test_refuses_checkpoint_from_other_shard_count(tmp_path, monkeypatch):
+    chatbot_engine = pytest.importorskip("chatbot_engine")
+    monkeypatch.setattr(chatbot_engine, "ChatbotEngine", FakeEngine)
+    path = write(tmp_path / "in.jsonl", "".join(json.dumps({"query": "x" * (i + 1)}) + "\n" for i in range(12)))
+    output = str(tmp_path / "out.jsonl")
+    # A 3-shard run killed after shard 0 finished
+    batch_cli.process_shard(path, output + ".part0", "query", 2, shard=0, num_shards=3)
+    with pytest.raises(batch_cli.CheckpointError, match="num_shards"):
+        batch_cli.run(path, output, batch_size=2, workers=2)
+    totals = batch_cli.run(path, output, batch_size=2, workers=2, restart=True)
+    assert totals["answered"] == 12
+    with open(output, encoding="utf-8") as f:
+        assert [json.loads(line)["line"] for line in f] == list(range(12))
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["in.jsonl", "out.jsonl"]
+
+
+def test_refuses_checkpoint_after_input_changes(tmp_path, monkeypatch):
+    chatbot_engine = pytest.importorskip("chatbot_engine")
+    monkeypatch.setattr(chatbot_engine, "ChatbotEngine", FakeEngine)
+    path = write(tmp_path / "in.jsonl", '{"query": "a"}\n{"query": "b"}\n')
+    output = str(tmp_path / "out.jsonl")
+    assert batch_cli.run(path, output)["answered"] == 2
+    assert batch_cli.run(path, output)["answered"] == 0  # Same input: nothing left to do
+    with pytest.raises(batch_cli.CheckpointError, match="field"):
+        batch_cli.run(path, output, field="question")
+    write(tmp_path / "in.jsonl", '{"query": "c"}\n{"query": "dd"}\n{"query": "eee"}\n')
+    with pytest.raises(batch_cli.CheckpointError, match="size"):
+        batch_cli.run(path, output)
+    assert batch_cli.run(path, output, restart=True)["answered"] == 3
+    with open(output, encoding="utf-8") as f:
+        assert [json.loads(line)["query"] for line in f] == ["c", "dd", "eee"]
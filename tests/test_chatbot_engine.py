@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("spacy")
+pytest.importorskip("transformers")
+
+from chatbot_engine import ChatbotEngine  # noqa: E402
+from response_cache import ResponseCache  # noqa: E402
+from semantic_cache import SemanticCache  # noqa: E402
+
+
+class FakeEngine(ChatbotEngine):
+    # ChatbotEngine without a model: classify() and embed() are canned, and
+    # every question embeds to the same vector, so any paraphrase is a hit
+
+    def __init__(self, cache=None, semantic_cache=None):
+        self.cache = cache
+        self.semantic_cache = semantic_cache
+        self.cascade = None
+        self._ner_executor = None
+        self.batch_size = 32
+        self.classified = []
+
+    def classify(self, texts, batch_size=None):
+        self.classified.extend(texts)
+        return [{"intent_id": 0, "intent": "buy_ticket", "confidence": 0.99, "logits": [0.0], "classifier": "albert"}
+                for _ in texts]
+
+    def extract_entities(self, texts, batch_size=None):
+        entities = [{"{{EVENT}}": "the event", "{{CITY}}": "the city"} for _ in texts]
+        return entities, [{"tier": "none", "ms": 0.0} for _ in texts]
+
+    def embed(self, texts, batch_size=None):
+        return np.ones((len(texts), 4), dtype=np.float32) / 2
+
+
+def stream(engine, text):
+    result = {}
+    response = "".join(engine.respond_streaming(text, result))
+    return response, result
+
+
+def test_streaming_uses_semantic_cache():
+    engine = FakeEngine(cache=ResponseCache(), semantic_cache=SemanticCache(capacity=8, threshold=0.9, dim=4))
+    first, first_result = stream(engine, "How do I buy a ticket?")
+    second, second_result = stream(engine, "how can i purchase tickets")
+    assert engine.classified == ["How do I buy a ticket?"]
+    assert first_result["source"] == "model"
+    assert second_result["source"] == "semantic_cache"
+    assert second_result["intent"] == "buy_ticket"
+    assert second == first
+    assert engine.semantic_cache.stats()["hits"] == 1
+
+
+def test_streaming_matches_respond():
+    engine = FakeEngine(cache=ResponseCache())
+    streamed, result = stream(engine, "How do I buy a ticket?")
+    assert result["source"] == "model"
+    _, cached = stream(engine, "How do I buy a ticket?")
+    assert cached["source"] == "cache"
+    assert engine.classified == ["How do I buy a ticket?"]
+    assert FakeEngine().respond(["How do I buy a ticket?"])[0]["response"] == streamed
+
+
+class CountingTokenizer:
+    # One token per word; counts tokenizer calls
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, texts, truncation=True, max_length=None):
+        self.calls += 1
+        ids = [[1] * len(text.split()) for text in texts]
+        return {"input_ids": ids, "attention_mask": [[1] * len(row) for row in ids]}
+
+    def pad(self, encodings, padding=True, return_tensors="pt"):
+        import torch
+        longest = max(len(encoding["input_ids"]) for encoding in encodings)
+        return {name: torch.tensor([encoding[name] + [0] * (longest - len(encoding[name])) for encoding in encodings])
+                for name in encodings[0]}
+
+
+class LengthEncoder:
+
+    def embed(self, batch):
+        return batch["attention_mask"].sum(dim=1, keepdim=True).float().numpy()
+
+
+def test_embed_shares_token_cache_with_classify():
+    from tokenization import TokenCache
+
+    engine = FakeEngine()
+    engine.tokenizer = CountingTokenizer()
+    engine.token_cache = TokenCache(engine.tokenizer, max_length=16)
+    engine.semantic_encoder = LengthEncoder()
+    texts = ["How do I buy a ticket?", "refund please", "How do I buy a ticket?"]
+    assert ChatbotEngine.embed(engine, texts, batch_size=2).ravel().tolist() == [6.0, 2.0, 6.0]
+    engine.token_cache.encode(texts)  # What classify() tokenizes with
+    assert engine.tokenizer.calls == 1
+    assert engine.token_cache.stats()["hits"] == 3
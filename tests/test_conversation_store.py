@@ -0,0 +1,60 @@
+from conversation_store import MemoryConversationStore, SQLiteConversationStore, open_conversation_store
+
+
+def city(name):
+    return {"{{CITY}}": f"<b>{name}</b>"}
+
+
+def test_memory_store_keeps_last_turns():
+    store = MemoryConversationStore(max_turns=3)
+    for turn in range(5):
+        store.append("a", f"question {turn}", turn, city("London"))
+    assert store.count("a") == 3
+    assert [turn.query for turn in store.recent("a", 10)] == ["question 2", "question 3", "question 4"]
+    assert store.recent("a", 1)[0].entities == city("London")
+
+
+def test_memory_store_releases_entities():
+    store = MemoryConversationStore(max_turns=2, max_sessions=2)
+    store.append("a", "q", 0, city("London"))
+    store.append("a", "q", 0, city("Paris"))
+    store.append("a", "q", 0, city("Rome"))  # Pushes out the London turn
+    assert len(store._entities) == 2
+    store.append("b", "q", 0, city("Rome"))
+    store.append("c", "q", 0, city("Oslo"))  # Evicts session "a"
+    assert len(store._entities) == 2  # Rome (still used by "b") and Oslo
+    store.clear("b")
+    store.clear("c")
+    assert len(store._entities) == 0
+    store.append("d", "q", 0, city("Lisbon"))
+    assert store.recent("d", 1)[0].entities == city("Lisbon")
+    assert len(store._entities.values) == 3  # Freed ids are reused
+
+
+def test_sqlite_store_caps_turns(tmp_path):
+    store = open_conversation_store(str(tmp_path / "history.db"), max_turns=3)
+    try:
+        assert isinstance(store, SQLiteConversationStore)
+        for turn in range(5):
+            store.append("a", f"question {turn}", turn, city("London"))
+            store.append("b", f"other {turn}", turn, {})
+        assert store.count("a") == 3
+        assert [turn.query for turn in store.recent("a", 10)] == ["question 2", "question 3", "question 4"]
+        assert store.recent("a", 1)[0].entities == city("London")
+        assert store.count("b") == 3
+    finally:
+        store.close()
+
+
+def test_sqlite_store_survives_reopen(tmp_path):
+    path = str(tmp_path / "history.db")
+    store = SQLiteConversationStore(path, entity_cache_size=1)
+    store.append("a", "question", 4, city("Madrid"))
+    store.append("a", "question", 4, city("Paris"))
+    store.close()
+    store = SQLiteConversationStore(path)
+    try:
+        assert [turn.entities for turn in store.recent("a", 10)] == [city("Madrid"), city("Paris")]
+        assert [session_id for session_id, _ in store.iter_turns()] == ["a", "a"]
+    finally:
+        store.close()
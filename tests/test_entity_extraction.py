@@ -0,0 +1,70 @@
+import pytest
+
+spacy = pytest.importorskip("spacy")
+
+from entity_extraction import GazetteerTier, TieredEntityExtractor, found_placeholders, placeholders_from_doc  # noqa: E402
+
+
+class FakeTier:
+    # Labels fixed spans (token offsets) of every text, counting the calls
+
+    def __init__(self, spans):
+        self.nlp = spacy.blank("en")
+        self.spans = spans
+        self.texts = []
+
+    def __call__(self, text):
+        self.texts.append(text)
+        doc = self.nlp.make_doc(text)
+        doc.ents = [doc.char_span(text.index(words), text.index(words) + len(words), label=label)
+                    for words, label in self.spans if words in text]
+        return doc
+
+    def pipe(self, texts, batch_size=None, n_process=1):
+        return (self(text) for text in texts)
+
+
+def extractor(*tiers):
+    extractor = TieredEntityExtractor(small_model=None)
+    extractor.tiers += [(f"fake{i}", tier) for i, tier in enumerate(tiers)]
+    return extractor
+
+
+@pytest.mark.parametrize("text", [
+    "Can you help us open a dispute about my order?",
+    "I am reading festival reviews before buying",
+    "Is the phoenix logo on the ticket?",
+])
+def test_gazetteer_skips_ordinary_words(text):
+    found = placeholders_from_doc(GazetteerTier()(text))
+    assert found == {"{{EVENT}}": "the event", "{{CITY}}": "the city"}
+
+
+def test_gazetteer_matches_names():
+    found = placeholders_from_doc(GazetteerTier()("I want to cancel my US Open ticket in new york city"))
+    assert found == {"{{EVENT}}": "<b>US Open</b>", "{{CITY}}": "<b>New York City</b>"}
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("sxsw tickets please", {"{{EVENT}}": "<b>SXSW</b>"}),
+    ("Are NBA Finals tickets refundable?", {"{{EVENT}}": "<b>NBA Finals</b>"}),
+    ("comic-con in rio de janeiro", {"{{EVENT}}": "<b>Comic-Con</b>", "{{CITY}}": "<b>Rio de Janeiro</b>"}),
+])
+def test_gazetteer_keeps_canonical_spelling(text, expected):
+    assert found_placeholders(GazetteerTier()(text)) == expected
+
+
+def test_later_tier_fills_missing_slot():
+    fallback = FakeTier([("Jazz Night", "EVENT"), ("London", "GPE")])
+    placeholders, report = extractor(fallback).extract("Tickets for Jazz Night in London")
+    assert placeholders == {"{{EVENT}}": "<b>Jazz Night</b>", "{{CITY}}": "<b>London</b>"}
+    assert report["tier"] == "fake0"
+    assert set(report["tiers_ms"]) == {"gazetteer", "fake0"}
+
+
+def test_stops_once_both_slots_are_filled():
+    fallback = FakeTier([("Paris", "GPE")])
+    results, reports = extractor(fallback).extract_batch(["Coachella tickets in Madrid", "Coachella tickets in Paris?"])
+    assert results[0] == {"{{EVENT}}": "<b>Coachella</b>", "{{CITY}}": "<b>Madrid</b>"}
+    assert reports[0]["tier"] == "gazetteer"
+    assert fallback.texts == []
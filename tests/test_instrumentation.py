@@ -0,0 +1,51 @@
+import urllib.request
+
+from instrumentation import Metrics, start_metrics_server
+
+
+def scrape(registry):
+    server = start_metrics_server(port=0, registry=registry)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            text = response.read().decode("utf-8")
+    finally:
+        server.shutdown()
+        server.server_close()
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_histogram_overflow_goes_to_inf_bucket():
+    registry = Metrics(enabled=True)
+    registry.observe("chatbot_token_length", 8)
+    registry.observe("chatbot_token_length", 600)  # Above the last bound (512)
+    samples = scrape(registry)
+    assert samples["chatbot_token_length_sum"] == 608
+    assert samples["chatbot_token_length_count"] == 2
+    assert samples['chatbot_token_length_bucket{le="8"}'] == 1
+    assert samples['chatbot_token_length_bucket{le="512"}'] == 1
+    assert samples['chatbot_token_length_bucket{le="+Inf"}'] == 2
+
+
+def test_labelled_counters_and_histograms():
+    registry = Metrics(enabled=True)
+    registry.inc("chatbot_intent_total", {"intent": "buy_ticket"})
+    registry.inc("chatbot_intent_total", {"intent": "buy_ticket"})
+    registry.observe("chatbot_stage_seconds", 0.003, {"stage": "forward"})
+    samples = scrape(registry)
+    assert samples['chatbot_intent_total{intent="buy_ticket"}'] == 2
+    assert samples['chatbot_stage_seconds_bucket{stage="forward",le="0.0025"}'] == 0
+    assert samples['chatbot_stage_seconds_bucket{stage="forward",le="0.005"}'] == 1
+    assert samples['chatbot_stage_seconds_bucket{stage="forward",le="+Inf"}'] == 1
+
+
+def test_disabled_registry_records_nothing():
+    registry = Metrics()
+    registry.observe("chatbot_batch_size", 4)
+    registry.inc("chatbot_cache_total", {"source": "model"})
+    assert registry.render() == "\n"
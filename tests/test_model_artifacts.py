@@ -0,0 +1,80 @@
+import functools
+import hashlib
+import http.server
+import os
+import threading
+
+import pytest
+
+from model_artifacts import ArtifactError, ensure_model_files, is_stale
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+
+def manifest_for(files):
+    return {name: (len(data), hashlib.sha256(data).hexdigest()) for name, data in files.items()}
+
+
+@pytest.fixture
+def served(tmp_path):
+    # Local HTTP stand-in for the GitHub repo, serving tmp_path/served
+    root = tmp_path / "served"
+    root.mkdir()
+    handler = functools.partial(QuietHandler, directory=str(root))
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield root, f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+files = {"config.json": b'{"model_type": "albert"}', "model.safetensors": os.urandom(3 << 20)}
+
+
+def test_downloads_and_verifies(served, tmp_path):
+    root, url = served
+    for name, data in files.items():
+        (root / name).write_bytes(data)
+    report = {}
+    model_dir = str(tmp_path / "model")
+    assert ensure_model_files(model_dir, None, url, manifest_for(files), report=report) == model_dir
+    for name, data in files.items():
+        assert (tmp_path / "model" / name).read_bytes() == data
+        assert report[name]["source"] == "downloaded"
+    ensure_model_files(model_dir, None, url, manifest_for(files), report=report)
+    assert all(entry["source"] == "cached" for entry in report.values())
+
+
+def test_rejects_corrupted_download(served, tmp_path):
+    root, url = served
+    (root / "config.json").write_bytes(files["config.json"])
+    corrupted = bytearray(files["model.safetensors"])
+    corrupted[12345] ^= 0xFF  # Same size, different sha256
+    (root / "model.safetensors").write_bytes(bytes(corrupted))
+    with pytest.raises(ArtifactError, match="model.safetensors failed size/sha256 verification"):
+        ensure_model_files(str(tmp_path / "model"), None, url, manifest_for(files))
+    assert sorted(os.listdir(tmp_path / "model")) == [".lock", "config.json"]  # No partial or corrupt file left
+
+
+def test_missing_file_fails(served, tmp_path):
+    _, url = served
+    with pytest.raises(ArtifactError, match="Status code: 404"):
+        ensure_model_files(str(tmp_path / "model"), None, url, manifest_for(files))
+
+
+def test_is_stale(tmp_path):
+    source, target = tmp_path / "model.safetensors", tmp_path / "model.onnx"
+    source.write_bytes(b"weights")
+    assert is_stale(str(target), [str(source)])
+    target.write_bytes(b"graph")
+    os.utime(source, (1000, 1000))
+    assert not is_stale(str(target), [str(source)])
+    os.utime(source, (os.path.getmtime(target) + 10,) * 2)
+    assert is_stale(str(target), [str(source)])
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from semantic_cache import SemanticCache, calibrate  # noqa: E402
+
+
+def unit(rows):
+    rows = np.asarray(rows, dtype=np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def test_dimension_follows_first_embedding():
+    cache = SemanticCache(capacity=4, threshold=0.9)
+    assert cache.lookup(unit([[1, 0, 0]])) == [None]
+    cache.add(unit([[1, 0, 0]])[0], {"intent": "buy_ticket"})
+    assert cache.lookup(unit([[1, 0.1, 0], [0, 1, 0]])) == [{"intent": "buy_ticket"}, None]
+
+
+def test_calibrated_threshold_separates_close_intents():
+    # "buy" and "sell" questions sit at ~0.98 similarity, each intent's own
+    # paraphrases at ~0.999: only a threshold above 0.98 is precise
+    rng = np.random.default_rng(0)
+    texts, rows, intents = [], [], []
+    for intent, centre in enumerate([[1, 0.2, 0], [1, 0, 0.2]]):
+        for i in range(40):
+            texts.append(f"question {intent}-{i}")
+            rows.append(np.array(centre) + rng.normal(0, 0.005, 3))
+            intents.append(intent)
+    report = calibrate(texts, unit(rows), intents, target_precision=0.99, threshold=0.95)
+    assert report["requested"]["precision"] < 0.9
+    assert report["calibrated"]["threshold"] > 0.98
+    assert report["calibrated"]["precision"] >= 0.99
+    assert report["closest_disagreements"][0]["intent"] != report["closest_disagreements"][0]["cached_intent"]
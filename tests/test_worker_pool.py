@@ -0,0 +1,81 @@
+import os
+import time
+
+import pytest
+
+from worker_pool import WorkerPool
+
+
+class FakeEngine:
+    # Stands in for ChatbotEngine in the spawned workers: "crash" kills the
+    # worker, "hang" never answers, "slow" takes a moment; anything else is
+    # echoed back upper-cased. With broken_flag set, a worker started after
+    # that file exists dies before becoming ready.
+
+    def __init__(self, broken_flag=None, **options):
+        if broken_flag and os.path.exists(broken_flag):
+            os._exit(1)
+
+    def respond(self, queries):
+        for query in queries:
+            if query == "crash":
+                os._exit(3)
+            if query == "hang":
+                time.sleep(60)
+            if query == "slow":
+                time.sleep(0.2)
+        return [{"response": query.upper()} for query in queries]
+
+
+def make_pool(workers=1, engine_options=None, **kwargs):
+    return WorkerPool(engine_options or {}, workers=workers, threads_per_worker=1, pin_cores=False,
+                      engine_factory=FakeEngine, **kwargs)
+
+
+def test_close_answers_queued_requests():
+    pool = make_pool().start()
+    futures = [pool.submit(["slow", f"q{i}"]) for i in range(4)]
+    pool.close()
+    assert [future.result(timeout=0) for future in futures] == [
+        [{"response": "SLOW"}, {"response": f"Q{i}"}] for i in range(4)]
+    with pytest.raises(RuntimeError):
+        pool.submit(["late"])
+
+
+def test_close_fails_unanswered_requests():
+    pool = make_pool().start()
+    future = pool.submit(["hang"])
+    pool.close(timeout=1)
+    with pytest.raises(RuntimeError):
+        future.result(timeout=0)
+
+
+def test_crashing_request_is_retried_then_failed():
+    with make_pool(max_retries=1, backoff=0.01) as pool:
+        with pytest.raises(RuntimeError, match="died 2 times"):
+            pool.submit(["crash"]).result(timeout=30)
+        assert pool.restarts == 2
+        assert pool.respond(["hello"]) == [{"response": "HELLO"}]
+
+
+def test_gives_up_after_max_restarts(tmp_path):
+    flag = tmp_path / "broken"
+    pool = make_pool(engine_options={"broken_flag": str(flag)}, max_restarts=2, backoff=0.01).start()
+    try:
+        flag.touch()
+        with pytest.raises(RuntimeError, match="all chatbot workers failed"):
+            pool.submit(["crash"]).result(timeout=30)
+        assert pool.restarts == 2
+        with pytest.raises(RuntimeError):
+            pool.submit(["hello"])
+    finally:
+        pool.close()
+
+
+def test_request_timeout():
+    pool = make_pool(request_timeout=0.5).start()
+    try:
+        with pytest.raises(TimeoutError):
+            pool.submit(["hang"]).result(timeout=10)
+    finally:
+        pool.close(timeout=0)
@@ -0,0 +1,207 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Tokenizer loading and the encoding cache in front of it.
+#
+# The model directory only ships the SentencePiece spiece.model, so every
+# AutoTokenizer.from_pretrained() converts it into a fast (Rust `tokenizers`)
+# tokenizer from scratch. load_tokenizer() saves the converted tokenizer.json
+# under cache_dir the first time and loads it directly afterwards. The file is
+# named after a digest of the tokenizer files and the transformers version,
+# so a changed spiece.model is converted again, and the (possibly read-only)
+# bundled model directory is never written to.
+#
+# Questions are truncated to max_length tokens. The default is the 512 the
+# model was fine-tuned with (its position limit); batches are padded to
+# their own longest question either way, so a lower cap only changes the
+# outliers above it. `python tokenization.py measure` reports the token
+# length distribution of the Bitext training questions (or --data) and the
+# smallest multiple of 16 covering the 99.9th percentile with 25% headroom,
+# to set CHATBOT_MAX_LENGTH from.
+#
+# TokenCache keeps the encodings of recently seen questions, so repeated ones
+# (the dropdown examples, retries) skip the tokenizer, and PaddingStats counts
+# how many of the tokens in padded batches are real.
+
+default_max_length = 512
+default_cache_dir = "./.chatbot_cache"
+
+# Files the fast tokenizer is converted from
+tokenizer_sources = ["spiece.model", "tokenizer_config.json", "special_tokens_map.json"]
+
+
+# Key for a file derived from model_dir: a digest of the named files there
+# and the version of the code that derives it
+def cache_digest(model_dir, names, version):
+    digest = hashlib.sha256(version.encode("utf-8"))
+    for name in names:
+        path = os.path.join(model_dir, name)
+        if os.path.exists(path):
+            digest.update(name.encode("utf-8") + b"\0")
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def load_tokenizer(model_dir, cache_dir=default_cache_dir):
+    import transformers
+    from transformers import AutoTokenizer
+
+    if os.path.exists(os.path.join(model_dir, "tokenizer.json")):
+        return AutoTokenizer.from_pretrained(model_dir)  # Shipped with the model
+    digest = cache_digest(model_dir, tokenizer_sources, transformers.__version__)
+    path = os.path.join(cache_dir, f"tokenizer-{digest}.json")
+    if os.path.exists(path):
+        return AutoTokenizer.from_pretrained(model_dir, tokenizer_file=path)
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    if tokenizer.is_fast:
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tokenizer.backend_tokenizer.save(tmp_path)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass  # Read-only cache directory: convert again next time
+    return tokenizer
+
+
+class TokenCache:
+
+    def __init__(self, tokenizer, max_length=default_max_length, max_size=4096):
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # text -> encoding (dict of token lists)
+        self._lock = threading.Lock()
+
+    def encode(self, texts):
+        # One encoding per text; the texts not in the cache are tokenized
+        # together in a single batched call. Encodings are shared, don't mutate.
+        encodings = [None] * len(texts)
+        missing = []
+        with self._lock:
+            for i, text in enumerate(texts):
+                encoding = self._entries.get(text)
+                if encoding is None:
+                    missing.append(i)
+                else:
+                    self._entries.move_to_end(text)
+                    encodings[i] = encoding
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        if not missing:
+            return encodings
+        unique = list(dict.fromkeys(texts[i] for i in missing))
+        batch = self.tokenizer(unique, truncation=True, max_length=self.max_length)
+        names = list(batch.keys())
+        fresh = {text: {name: batch[name][row] for name in names} for row, text in enumerate(unique)}
+        with self._lock:
+            for text, encoding in fresh.items():
+                self._entries[text] = encoding
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        for i in missing:
+            encodings[i] = fresh[texts[i]]
+        return encodings
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class PaddingStats:
+
+    def __init__(self):
+        self.batches = 0
+        self.tokens = 0         # real tokens
+        self.padded_tokens = 0  # batch size x longest member, summed over batches
+        self._lock = threading.Lock()
+
+    def add(self, lengths):
+        with self._lock:
+            self.batches += 1
+            self.tokens += sum(lengths)
+            self.padded_tokens += len(lengths) * max(lengths)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "tokens": self.tokens,
+            "padded_tokens": self.padded_tokens,
+            "padding_efficiency": self.tokens / self.padded_tokens if self.padded_tokens else 1.0,
+        }
+
+
+# Smallest multiple of `multiple` covering the percentile with some headroom
+def recommend_max_length(lengths, percentile=99.9, headroom=1.25, multiple=16, ceiling=512):
+    covered = np.percentile(lengths, percentile) * headroom
+    return int(min(ceiling, multiple * math.ceil(covered / multiple)))
+
+
+def measure(tokenizer, texts, batch_size=32):
+    # Token length distribution without truncation, and how much padding
+    # batching in arrival order vs sorted by length would cost
+    lengths = [len(input_ids) for input_ids in tokenizer(texts)["input_ids"]]
+
+    def efficiency(ordered):
+        stats = PaddingStats()
+        for start in range(0, len(ordered), batch_size):
+            stats.add(ordered[start:start + batch_size])
+        return stats.stats()["padding_efficiency"]
+
+    return {
+        "questions": len(lengths),
+        "p50": float(np.percentile(lengths, 50)),
+        "p95": float(np.percentile(lengths, 95)),
+        "p99": float(np.percentile(lengths, 99)),
+        "p99.9": float(np.percentile(lengths, 99.9)),
+        "max": max(lengths),
+        "recommended_max_length": recommend_max_length(lengths),
+        "padding_efficiency_unsorted": efficiency(lengths),
+        "padding_efficiency_sorted": efficiency(sorted(lengths)),
+    }
+
+
+def main():
+    from cascade_classifier import dataset_url, load_training_data
+    from model_artifacts import default_model_dir, ensure_model_files
+
+    parser = argparse.ArgumentParser(description="Measure question token lengths to pick the tokenizer max_length")
+    parser.add_argument("command", choices=["measure"])
+    parser.add_argument("--data", default=dataset_url, help="Bitext CSV to measure (path or URL; default: training data)")
+    parser.add_argument("--limit", type=int, default=None, help="measure only the first N questions")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--model-dir", default=default_model_dir)
+    args = parser.parse_args()
+
+    texts = load_training_data(args.data)[0][:args.limit]
+    tokenizer = load_tokenizer(ensure_model_files(args.model_dir))
+    json.dump(measure(tokenizer, texts, args.batch_size), sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
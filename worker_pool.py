@@ -0,0 +1,429 @@
+import argparse
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.connection import wait
+
+# Multi-process serving: N worker processes, each with its own ChatbotEngine
+# (model and tokenizer from load_model_and_tokenizer), pulling questions from
+# one shared request queue.
+#
+# Every worker is pinned with sched_setaffinity to its own slice of the cores
+# and runs torch with exactly that many intra-op threads, so workers don't
+# fight over cores and the NER runs on the same cores as the classifier
+# instead of oversubscribing them. A worker takes one request and then
+# whatever else is already queued (up to max_batch_size questions), and
+# answers them with one engine.respond() call.
+#
+# Each worker sends its answers back over its own pipe. A dispatcher thread in
+# the parent waits on those pipes and on the worker processes, and resolves
+# each request's Future. A worker reports each request as taken as soon as it
+# is off the queue (pipe sends are synchronous, so the report is out even if
+# the worker is killed right after), and when a worker dies the dispatcher
+# starts a replacement on the same cores and puts its unanswered requests back
+# on the queue (up to max_retries times per request). A worker killed between
+# dequeuing a request and reporting it still loses that request; set
+# request_timeout to bound how long its caller waits.
+#
+#   python inference_server.py serve --workers 4 --threads-per-worker 4
+#   python worker_pool.py --workers 1 2 4 8 --threads 1 2 4
+#
+# The second form is the scaling benchmark: throughput and latency for each
+# worker count and thread split that fits on the machine.
+
+logger = logging.getLogger(__name__)
+
+
+def available_cores():
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:  # Not Linux
+        return list(range(os.cpu_count() or 1))
+
+
+# One list of core ids per worker, or None per worker when they don't fit
+# side by side (workers x threads > cores) and pinning would only hurt
+def plan_cores(workers, threads_per_worker, cores=None):
+    cores = cores or available_cores()
+    if workers * threads_per_worker > len(cores):
+        return [None] * workers
+    return [cores[i * threads_per_worker:(i + 1) * threads_per_worker] for i in range(workers)]
+
+
+def _take(worker_id, request, results):
+    # Report a request as taken the moment it is off the queue, so the
+    # parent knows to retry it if this worker dies while answering it
+    if request is not None:
+        results.send(("taken", worker_id, request[0]))
+    return request
+
+
+def _worker_main(worker_id, engine_options, threads, cores, max_batch_size, requests, results, engine_factory=None):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C is for the parent, which shuts the pool down
+    if cores is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    if engine_factory is None:
+        from chatbot_engine import ChatbotEngine as engine_factory
+
+    engine = engine_factory(**dict(engine_options, parallel=False, torch_threads=threads))
+    results.send(("ready", worker_id, None))
+    while True:
+        request = _take(worker_id, requests.get(), results)
+        if request is None:
+            return
+        batch = [request]
+        size = len(request[1])
+        while size < max_batch_size:
+            try:
+                request = _take(worker_id, requests.get_nowait(), results)
+            except queue.Empty:
+                break
+            if request is None:
+                requests.put(None)  # Not ours to consume yet; stop after this batch
+                break
+            batch.append(request)
+            size += len(request[1])
+        try:
+            answers = engine.respond([query for _, queries in batch for query in queries])
+        except Exception as e:
+            for request_id, _ in batch:
+                results.send(("error", worker_id, (request_id, f"{type(e).__name__}: {e}")))
+            continue
+        start = 0
+        for request_id, queries in batch:
+            results.send(("done", worker_id, (request_id, answers[start:start + len(queries)])))
+            start += len(queries)
+
+
+class WorkerPool:
+    # engine_factory builds the engine in each worker from engine_options
+    # (default: ChatbotEngine); it must be importable by name, since workers
+    # are spawned. A worker that dies is restarted after a backoff that
+    # doubles with every consecutive failure (up to max_backoff seconds); one
+    # that fails max_restarts times in a row without becoming ready is given
+    # up, and once no worker is left every pending request fails. With
+    # request_timeout, requests not answered in time fail with TimeoutError.
+
+    def __init__(self, engine_options, workers=2, threads_per_worker=None, max_batch_size=32, max_retries=2,
+                 pin_cores=True, max_restarts=5, backoff=0.5, max_backoff=30.0, request_timeout=None,
+                 engine_factory=None):
+        cores = available_cores()
+        self.engine_options = engine_options
+        self.engine_factory = engine_factory
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker or max(1, len(cores) // workers)
+        self.max_batch_size = max_batch_size
+        self.max_retries = max_retries
+        self.max_restarts = max_restarts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.request_timeout = request_timeout
+        self.core_plan = plan_cores(workers, self.threads_per_worker, cores) if pin_cores else [None] * workers
+        self.restarts = 0
+        self._context = multiprocessing.get_context("spawn")
+        self._requests = self._context.Queue()
+        self._processes = {}
+        self._connections = {}  # worker id -> receiving end of its result pipe
+        self._pending = {}    # request id -> (queries, future, attempts, deadline)
+        self._in_flight = {}  # worker id -> request ids taken but not answered
+        self._failures = {}   # worker id -> consecutive exits without becoming ready
+        self._restart_at = {}  # worker id -> monotonic time of its scheduled restart
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._dispatcher = None
+        self._closing = False
+        self._broken = None  # Error every request fails with once no worker is left
+
+    def _start_worker(self, worker_id):
+        receiver, sender = self._context.Pipe(duplex=False)
+        process = self._context.Process(
+            target=_worker_main,
+            args=(worker_id, self.engine_options, self.threads_per_worker, self.core_plan[worker_id],
+                  self.max_batch_size, self._requests, sender, self.engine_factory),
+            name=f"chatbot-worker-{worker_id}",
+            daemon=True,
+        )
+        process.start()
+        sender.close()  # Only the worker writes; lets recv() see EOF when it exits
+        self._processes[worker_id] = process
+        self._connections[worker_id] = receiver
+        self._in_flight[worker_id] = []
+
+    def start(self, timeout=600):
+        # Start every worker and wait until each has loaded its model
+        for worker_id in range(self.workers):
+            self._start_worker(worker_id)
+        deadline = time.monotonic() + timeout
+        waiting = dict(self._connections)
+        while waiting:
+            remaining = deadline - time.monotonic()
+            ready = wait(list(waiting.values()), timeout=max(0.0, remaining))
+            if not ready:
+                self.close()
+                raise RuntimeError("chatbot workers did not start in time")
+            for worker_id, connection in list(waiting.items()):
+                if connection not in ready:
+                    continue
+                try:
+                    connection.recv()
+                except (EOFError, OSError):
+                    process = self._processes[worker_id]
+                    self.close()
+                    raise RuntimeError(f"chatbot worker {worker_id} failed to start (exit code {process.exitcode})")
+                del waiting[worker_id]
+        self._dispatcher = threading.Thread(target=self._dispatch, name="worker-pool-dispatcher", daemon=True)
+        self._dispatcher.start()
+        return self
+
+    def submit(self, queries):
+        # Future resolving to the list of engine.respond() results for queries
+        future = Future()
+        request_id = next(self._ids)
+        deadline = time.monotonic() + self.request_timeout if self.request_timeout else None
+        with self._lock:
+            if self._closing or self._broken is not None:
+                raise RuntimeError(self._broken or "worker pool is closed")
+            self._pending[request_id] = (list(queries), future, 0, deadline)
+        self._requests.put((request_id, list(queries)))
+        return future
+
+    def respond(self, queries):
+        return self.submit(queries).result()
+
+    def _dispatch(self):
+        # Runs until close() has been called and every worker has exited, so
+        # answers sent while shutting down are still delivered
+        while self._processes or (self._restart_at and not self._closing):
+            now = time.monotonic()
+            for worker_id, restart_at in list(self._restart_at.items()):
+                if self._closing:
+                    del self._restart_at[worker_id]
+                elif restart_at <= now:
+                    del self._restart_at[worker_id]
+                    self._start_worker(worker_id)
+            self._expire(now)
+            connections = {connection: worker_id for worker_id, connection in self._connections.items()}
+            sentinels = {process.sentinel: worker_id for worker_id, process in self._processes.items()}
+            timeout = min([0.5] + [max(0.0, at - now) for at in self._restart_at.values()])
+            if not connections:
+                time.sleep(timeout)
+                continue
+            ready = wait(list(connections) + list(sentinels), timeout=timeout)
+            for connection in ready:
+                if connection in connections:
+                    self._receive(connection)
+            for sentinel in ready:
+                if sentinel in sentinels:
+                    self._worker_exited(sentinels[sentinel])
+
+    def _expire(self, now):
+        if self.request_timeout is None:
+            return
+        with self._lock:
+            expired = [request_id for request_id, entry in self._pending.items() if entry[3] <= now]
+            futures = [self._pending.pop(request_id)[1] for request_id in expired]
+        for future in futures:
+            future.set_exception(TimeoutError(f"no answer within {self.request_timeout}s"))
+
+    def _receive(self, connection):
+        try:
+            message = connection.recv()
+        except (EOFError, OSError):
+            return  # Worker gone; its sentinel triggers the restart
+        self._handle(*message)
+
+    def _handle(self, kind, worker_id, payload):
+        with self._lock:
+            if kind == "ready":
+                self._failures[worker_id] = 0
+                return
+            if kind == "taken":
+                self._in_flight[worker_id].append(payload)
+                return
+            request_id, value = payload
+            in_flight = self._in_flight.get(worker_id, [])
+            if request_id in in_flight:
+                in_flight.remove(request_id)
+            entry = self._pending.pop(request_id, None)
+        if entry is None:
+            return
+        if kind == "done":
+            entry[1].set_result(value)
+        else:
+            entry[1].set_exception(RuntimeError(value))
+
+    def _worker_exited(self, worker_id):
+        process = self._processes.pop(worker_id)
+        connection = self._connections.pop(worker_id)
+        # Take in whatever it managed to send before exiting
+        while True:
+            try:
+                if not connection.poll():
+                    break
+                message = connection.recv()
+            except (EOFError, OSError):
+                break
+            self._handle(*message)
+        connection.close()
+        process.join()
+        with self._lock:
+            in_flight = self._in_flight.pop(worker_id, [])
+            if self._closing:
+                return  # Exiting as asked; close() fails whatever is left
+            retry, failed = [], []
+            for request_id in in_flight:
+                entry = self._pending.get(request_id)
+                if entry is None:
+                    continue
+                queries, future, attempts, deadline = entry
+                if attempts < self.max_retries:
+                    self._pending[request_id] = (queries, future, attempts + 1, deadline)
+                    retry.append((request_id, queries))
+                else:
+                    del self._pending[request_id]
+                    failed.append(future)
+            failures = self._failures.get(worker_id, 0) + 1
+            self._failures[worker_id] = failures
+        if failures <= self.max_restarts:
+            delay = min(self.max_backoff, self.backoff * 2 ** (failures - 1))
+            logger.warning("chatbot worker %d exited with code %s; restarting in %.1fs and retrying %d requests",
+                           worker_id, process.exitcode, delay, len(retry))
+            self.restarts += 1
+            self._restart_at[worker_id] = time.monotonic() + delay
+        else:
+            logger.error("chatbot worker %d exited with code %s, %d times in a row; giving up on it",
+                         worker_id, process.exitcode, failures)
+        for request in retry:
+            self._requests.put(request)
+        for future in failed:
+            future.set_exception(RuntimeError(f"worker {worker_id} died {self.max_retries + 1} times on this request"))
+        if not self._processes and not self._restart_at:
+            self._fail_all(f"all chatbot workers failed (last exit code {process.exitcode})")
+
+    def _fail_all(self, message):
+        with self._lock:
+            self._broken = message
+            futures = [entry[1] for entry in self._pending.values()]
+            self._pending.clear()
+        for future in futures:
+            future.set_exception(RuntimeError(message))
+
+    def close(self, timeout=30):
+        # Let the workers answer everything already queued, then stop them;
+        # requests still unanswered after timeout seconds fail
+        with self._lock:
+            if self._closing:
+                return
+            self._closing = True
+        for _ in range(self.workers):
+            self._requests.put(None)
+        if self._dispatcher is not None:
+            self._dispatcher.join(timeout)
+        for process in list(self._processes.values()):
+            process.join(timeout=0 if self._dispatcher is not None else timeout)
+            if process.is_alive():
+                process.terminate()
+        if self._dispatcher is not None:
+            self._dispatcher.join()
+        else:
+            for worker_id in list(self._processes):
+                self._worker_exited(worker_id)
+        with self._lock:
+            futures = [entry[1] for entry in self._pending.values()]
+            self._pending.clear()
+        for future in futures:
+            future.set_exception(RuntimeError("worker pool closed before answering"))
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def run_scaling(engine_options, queries, workers, threads_per_worker, total_requests=1000, concurrency=64):
+    # Keep `concurrency` single-question requests outstanding until
+    # total_requests have been answered
+    from benchmark import percentile
+
+    latencies = []
+    with WorkerPool(engine_options, workers, threads_per_worker) as pool:
+        for query in queries[:workers * 4]:
+            pool.respond([query])  # Warm up every worker
+        outstanding = threading.BoundedSemaphore(concurrency)
+        done = threading.Event()
+        remaining = [total_requests]
+        lock = threading.Lock()
+
+        def finished(future, started):
+            latencies.append(time.perf_counter() - started)
+            outstanding.release()
+            with lock:
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    done.set()
+
+        started = time.perf_counter()
+        for i in range(total_requests):
+            outstanding.acquire()
+            submitted = time.perf_counter()
+            pool.submit([queries[i % len(queries)]]).add_done_callback(
+                lambda future, submitted=submitted: finished(future, submitted))
+        done.wait()
+        elapsed = time.perf_counter() - started
+    return {
+        "workers": workers,
+        "threads_per_worker": threads_per_worker,
+        "pinned": pool.core_plan[0] is not None,
+        "requests": total_requests,
+        "qps": total_requests / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def main():
+    from benchmark import synthetic_corpus
+    from chatbot_engine import capitalize_prompt, example_queries
+    from model_artifacts import default_model_dir, ensure_model_files
+    from model_backends import backend_names
+
+    parser = argparse.ArgumentParser(description="Throughput of the multi-process worker pool vs worker count and thread split")
+    parser.add_argument("--model-dir", default=default_model_dir)
+    parser.add_argument("--backend", choices=backend_names, default="torch")
+    parser.add_argument("--mmap-weights", action="store_true", help="share one copy of the weights between workers")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4], help="torch threads per worker")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    engine_options = {
+        "model_dir": ensure_model_files(args.model_dir),
+        "backend": args.backend,
+        "mmap_weights": args.mmap_weights,
+    }
+    queries = [capitalize_prompt(query) for query in example_queries] + synthetic_corpus(256)
+    cores = len(available_cores())
+    report = []
+    for workers in args.workers:
+        for threads in args.threads:
+            if workers * threads > cores:
+                continue
+            result = run_scaling(engine_options, queries, workers, threads, args.requests, args.concurrency)
+            report.append(result)
+            print(f"workers={workers:<2d} threads={threads:<2d} {result['qps']:.1f} q/s "
+                  f"p50={result['p50_ms']:.1f}ms p99={result['p99_ms']:.1f}ms", file=sys.stderr)
+    print(json.dumps({"cores": cores, "results": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()